@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""
+Measures the build time of SdeParser over an extracted SDE directory
+with and without the bulk load session
+
+usage: python3 benchmarks/bench_build.py <sde directory>
+"""
+import sys
+import tempfile
+from pathlib import Path
+
+from common import case, measure, run_case, speedup
+from sde_parser import SdeParser
+
+
+def build(sde_directory, bulk_load):
+    """builds a database in a temporary directory"""
+    with tempfile.TemporaryDirectory() as directory:
+        processor = SdeParser(sde_directory, Path(directory).joinpath('sde.db'))
+        processor.configuration.bulk_load = bulk_load
+        processor.create_table_structure()
+        processor.parse_data()
+        processor.close()
+
+
+@case('build', __doc__)
+def main(arguments):
+    sde_directory = Path(arguments[0])
+    before, _ = measure('default settings', build, sde_directory, False)
+    after, _ = measure('bulk load', build, sde_directory, True)
+    speedup(before, after)
+
+
+if __name__ == '__main__':
+    sys.exit(run_case('build', sys.argv[1:]))
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""
+Compares the ways to get the MD5 of sde.zip: the old md5sum that reads the
+file back in 128 byte chunks, the large buffer MiscUtils.file_digest and the
+digest calculated while the file is downloaded from a local HTTP server
+
+usage: python3 benchmarks/bench_checksum.py [size MiB]
+"""
+import hashlib
+import os
+import sys
+import tempfile
+from functools import partial
+from pathlib import Path
+
+from common import argument, case, measure, run_case, serve, speedup
+from misc_utils import MiscUtils
+
+
+def legacy_md5sum(filename):
+    """the md5sum used before the large buffer version"""
+    with open(filename, mode='rb') as f:
+        d = hashlib.md5()
+        for buf in iter(partial(f.read, 128), b''):
+            d.update(buf)
+    return d.hexdigest()
+
+
+def download_then_legacy(url, output):
+    """old path: download the file and read it back to hash it"""
+    MiscUtils.download_file(url, str(output))
+    return legacy_md5sum(output)
+
+
+def download_then_digest(url, output):
+    """download the file and read it back with the large buffer"""
+    MiscUtils.download_file(url, str(output))
+    return MiscUtils.file_digest(output)
+
+
+def download_hashing(url, output):
+    """the digest is ready when the last chunk is written"""
+    return MiscUtils.download_with_digest(url, str(output))[1]
+
+
+@case('checksum', __doc__)
+def main(arguments):
+    size = argument(arguments, 0, 128)
+    with tempfile.TemporaryDirectory() as directory:
+        served = Path(directory).joinpath('served')
+        served.mkdir()
+        source = served.joinpath('sde.zip')
+        with open(source, 'wb') as file:
+            for _ in range(size):
+                file.write(os.urandom(1024**2))
+        expected = hashlib.md5(source.read_bytes()).hexdigest()
+        print(f'file of {size} MiB')
+        results = [measure('md5sum (128 bytes)', legacy_md5sum, source),
+                   measure('file_digest (1 MiB)', MiscUtils.file_digest, source)]
+        server, url = serve(served)
+        output = Path(directory).joinpath('sde.zip')
+        for label, function in (('download + md5sum', download_then_legacy),
+                                ('download + file_digest', download_then_digest),
+                                ('download hashing', download_hashing)):
+            results.append(measure(label, function, url + 'sde.zip', output))
+            output.unlink()
+        server.shutdown()
+        assert all(digest == expected for _, digest in results)
+    speedup(results[0][0], results[1][0], 'standalone speedup')
+    speedup(results[2][0], results[4][0], 'download speedup')
+
+
+if __name__ == '__main__':
+    sys.exit(run_case('checksum', sys.argv[1:]))
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""
+Compares the old one by one map download (MiscUtils.download_file) against
+the concurrent MapDownloader, the maps are served by a local stand-in of
+dotlan that adds a fixed latency to every request
+
+usage: python3 benchmarks/bench_map_download.py [maps] [latency ms] [workers]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import QuietHandler, argument, case, measure, run_case, serve, speedup
+from map_downloader import MapDownloader
+from misc_utils import MiscUtils
+from synthetic_sde import region_map
+
+
+class SlowHandler(QuietHandler):
+    """serves the fixture directory adding latency to every request"""
+    latency = 0.05
+
+    def send_head(self):
+        time.sleep(self.latency)
+        return super().send_head()
+
+
+def sequential(base_url, names, output):
+    """the download path used before the MapDownloader"""
+    for name in names:
+        MiscUtils.download_file(base_url + name, str(output.joinpath(name)))
+
+
+def concurrent(base_url, names, output, workers):
+    """the MapDownloader path"""
+    jobs = [(name, base_url + name, output.joinpath(name)) for name in names]
+    with MapDownloader(workers) as downloader:
+        for _ in downloader.download_all(jobs):
+            pass
+
+
+@case('map_download', __doc__)
+def main(arguments):
+    maps = argument(arguments, 0, 64)
+    SlowHandler.latency = argument(arguments, 1, 50) / 1000
+    workers = argument(arguments, 2, 4)
+    with tempfile.TemporaryDirectory() as directory:
+        fixtures = Path(directory).joinpath('svg')
+        fixtures.mkdir()
+        map_names = []
+        for region in range(maps):
+            map_names.append(f'Region_{region}.svg')
+            first_system = 30000001 + region * 120
+            fixtures.joinpath(map_names[-1]).write_bytes(
+                region_map(range(first_system, first_system + 120)))
+        server, url = serve(fixtures, SlowHandler)
+        for label in ('sequential', 'concurrent'):
+            Path(directory).joinpath(label).mkdir()
+        print(f'{maps} maps')
+        before, _ = measure('sequential', sequential, url, map_names,
+                            Path(directory).joinpath('sequential'))
+        after, _ = measure('concurrent', concurrent, url, map_names,
+                           Path(directory).joinpath('concurrent'), workers)
+        for map_name in map_names:
+            assert Path(directory).joinpath('concurrent', map_name).read_bytes() == \
+                fixtures.joinpath(map_name).read_bytes()
+        server.shutdown()
+    speedup(before, after)
+
+
+if __name__ == '__main__':
+    sys.exit(run_case('map_download', sys.argv[1:]))
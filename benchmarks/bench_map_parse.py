@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""
+Compares the old map parsing (a full ElementTree, two findall scans, one
+UPDATE per ice belt and one INSERT per system) against ExternalParser,
+which reads the maps with the streaming read_map and writes them in bulk,
+on synthetic dotlan region maps
+
+usage: python3 benchmarks/bench_map_parse.py [maps] [systems per map]
+"""
+import sqlite3
+import sys
+import tempfile
+import xml.etree.ElementTree
+from pathlib import Path
+
+from common import argument, case, measure, run_case, speedup
+from external_parser import ExternalParser, read_map
+from synthetic_sde import region_map
+
+TABLES = ('CREATE TABLE mapSolarSystems (solarSystemId INT NOT NULL PRIMARY KEY, '
+          'iceBelt BOOL NOT NULL DEFAULT 0);'
+          'CREATE TABLE mapAbstractSystems (solarSystemId INTEGER NOT NULL, '
+          'regionId INT NOT NULL, x INT NOT NULL, y INT NOT NULL, '
+          'CONSTRAINT pkey PRIMARY KEY (solarSystemId, regionId) ON CONFLICT FAIL);')
+
+
+def tree(database, map_files):
+    """the parsing used before read_map"""
+    connection = sqlite3.connect(database)
+    cur = connection.cursor()
+    for map_file in map_files:
+        root = xml.etree.ElementTree.ElementTree().parse(source=map_file)
+        ids = [tag.attrib.get('id')[3::] for tag in
+               root.findall(".//{http://www.w3.org/2000/svg}rect[@class='i']")]
+        cur.executemany('UPDATE mapSolarSystems SET iceBelt=1 WHERE solarSystemID IN (?)',
+                        ((tag_id,) for tag_id in ids))
+        region_id = int(map_file.name.split('.')[0])
+        for tag in root.findall('.//{http://www.w3.org/2000/svg}use'):
+            cur.execute('INSERT INTO mapAbstractSystems (solarSystemId,regionId,x,y)'
+                        ' VALUES (:id,:regionId,:X,:Y);',
+                        {'id': tag.attrib.get('id')[3::], 'regionId': region_id,
+                         'X': tag.attrib.get('x'), 'Y': tag.attrib.get('y')})
+        connection.commit()
+    cur.close()
+    connection.close()
+
+
+def streaming(database, map_files):
+    """the ExternalParser path: a bulk INSERT per map and one ice belt UPDATE"""
+    parser = ExternalParser(Path(database).parent, database)
+    for map_file in map_files:
+        parser._write_map_data(*read_map(map_file))
+    parser._mark_icebelts()
+    parser._db_driver.connection.commit()
+    parser._db_driver.connection.close()
+
+
+def parse(label, function, directory, map_files, system_ids):
+    """runs a parser on a new database, returns the time and the content"""
+    database = Path(directory).joinpath(label + '.db')
+    connection = sqlite3.connect(database)
+    connection.executescript(TABLES)
+    connection.executemany('INSERT INTO mapSolarSystems (solarSystemId) VALUES (?);',
+                           ((system_id,) for system_id in system_ids))
+    connection.commit()
+    elapsed, _ = measure(label, function, database, map_files)
+    content = (connection.execute('SELECT * FROM mapAbstractSystems ORDER BY 1, 2').fetchall(),
+               connection.execute('SELECT * FROM mapSolarSystems ORDER BY 1').fetchall())
+    connection.close()
+    return elapsed, content
+
+
+@case('map_parse', __doc__)
+def main(arguments):
+    maps = argument(arguments, 0, 68)
+    systems_per_map = argument(arguments, 1, 120)
+    with tempfile.TemporaryDirectory() as work_directory:
+        files = []
+        every_system = []
+        for region in range(maps):
+            first_system = 30000001 + region * systems_per_map
+            systems = range(first_system, first_system + systems_per_map)
+            every_system += systems
+            files.append(Path(work_directory).joinpath(f'{10000001 + region}.svg'))
+            files[-1].write_bytes(region_map(systems))
+        print(f'{maps} maps')
+        before, old_content = parse('tree', tree, work_directory, files, every_system)
+        after, new_content = parse('streaming', streaming, work_directory, files, every_system)
+        assert old_content == new_content
+    speedup(before, after)
+
+
+if __name__ == '__main__':
+    sys.exit(run_case('map_parse', sys.argv[1:]))
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""
+Compares the rows/sec of the old one execute per row insert path against
+the batched RowWriter, using the mapMoons table layout
+
+usage: python3 benchmarks/bench_row_writer.py [rows] [batch_size]
+"""
+import sys
+import sqlite3
+import tempfile
+from pathlib import Path
+
+from common import argument, case, measure, run_case, speedup
+from row_writer import RowWriter
+
+TABLE = ('CREATE TABLE mapMoons (moonId INT NOT NULL ,solarSystemId INTEGER, '
+         'moonIndex INTEGER NOT NULL, planetId INTEGER, positionX FLOAT NOT NULL, '
+         'positionY FLOAT NOT NULL, positionZ FLOAT NOT NULL, radius INTEGER, typeId INT, '
+         'CONSTRAINT pkey PRIMARY KEY (solarSystemId, moonId) ON CONFLICT FAIL);')
+
+
+def make_rows(total):
+    """Generates moon like rows"""
+    for cont in range(total):
+        yield (40000000 + cont, 30000000 + cont // 50, cont % 20, 40000000 + cont // 20,
+               14, 1000.0 + cont, cont * 1.5, cont * 2.5, cont * 3.5)
+
+
+def per_row(connection, total):
+    """the insert path used before the RowWriter"""
+    query = ('INSERT INTO mapMoons (moonId, solarSystemId, moonIndex, planetId, typeid, radius,'
+             ' positionX, positionY, positionZ) VALUES (:id, :solarSystemId, :moonIndex, '
+             ':planetId ,:typeId, :radius, :posX, :posY, :posZ );')
+    for row in make_rows(total):
+        cur = connection.cursor()
+        params = {}
+        params['id'] = row[0]
+        params['solarSystemId'] = row[1]
+        params['moonIndex'] = row[2]
+        params['planetId'] = row[3]
+        params['typeId'] = row[4]
+        params['radius'] = row[5]
+        params['posX'] = row[6]
+        params['posY'] = row[7]
+        params['posZ'] = row[8]
+        cur.execute(query, params)
+        cur.close()
+    connection.commit()
+
+
+def batched(connection, total, batch_size):
+    """the RowWriter insert path"""
+    writer = RowWriter(connection, batch_size)
+    writer.register('mapMoons', 'INSERT INTO mapMoons (moonId, solarSystemId, moonIndex, '
+                    'planetId, typeid, radius, positionX, positionY, positionZ) '
+                    'VALUES (?,?,?,?,?,?,?,?,?);')
+    writer.add_many('mapMoons', make_rows(total))
+    writer.flush()
+    connection.commit()
+
+
+def insert(label, function, rows, *args):
+    """runs a insert path against a fresh database file and prints rows/sec"""
+    with tempfile.TemporaryDirectory() as directory:
+        connection = sqlite3.connect(Path(directory).joinpath('bench.db'))
+        connection.execute(TABLE)
+        elapsed, _ = measure(label, function, connection, rows, *args)
+        connection.close()
+    print(f'{"":<24} {rows} rows -> {round(rows / elapsed)} rows/sec')
+    return elapsed
+
+
+@case('row_writer', __doc__)
+def main(arguments):
+    rows = argument(arguments, 0, 300000)
+    batch_size = argument(arguments, 1, 5000)
+    before = insert('per row', per_row, rows)
+    after = insert('batched', batched, rows, batch_size)
+    speedup(before, after)
+
+
+if __name__ == '__main__':
+    sys.exit(run_case('row_writer', sys.argv[1:]))
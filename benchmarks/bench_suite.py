@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""
+Builds a database from a synthetic SDE (or a given one) and measures every
+stage of SdeParser and ExternalParser through their Instrumentation: wall
+time, CPU time, rows written, rows/sec and peak RSS. The results can be saved as a baseline and later
+runs are compared against it. It runs offline, the region maps are
+generated next to the SDE. --case runs one of the comparisons of the
+bench_*.py scripts instead, e.g. --case row_writer 300000 5000
+
+usage: python3 benchmarks/bench_suite.py [--preset small] [--sde path]
+       [--workers N] [--save-baseline] [--baseline file] [--tolerance 0.25]
+       python3 benchmarks/bench_suite.py --case name [arguments]
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+
+from common import CASES, run_case
+from sde_parser import SdeParser
+from external_parser import ExternalParser
+from instrumentation import Instrumentation
+from synthetic_sde import PRESETS
+# the comparisons register themselves on CASES
+import bench_build  # noqa: F401
+import bench_checksum  # noqa: F401
+import bench_map_download  # noqa: F401
+import bench_map_parse  # noqa: F401
+import bench_row_writer  # noqa: F401
+
+GENERATOR = Path(__file__).resolve().parent.joinpath('synthetic_sde.py')
+DEFAULT_BASELINE = Path(__file__).resolve().parent.joinpath('baseline.json')
+
+
+def summarize(report):
+    """groups the stages by name, every region map is counted on 'maps'"""
+    stages = {}
+    for stage in report['stages']:
+        name = 'maps' if stage['name'].startswith('map ') else stage['name']
+        summary = stages.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'rows': 0,
+                                           'bytes_read': 0, 'calls': 0})
+        for key in ('wall', 'cpu', 'rows', 'bytes_read'):
+            summary[key] += stage[key]
+        summary['calls'] += 1
+        summary['peak_rss_kib'] = stage['peak_rss_kib']
+        summary['rows_per_sec'] = round(summary['rows'] / summary['wall']) \
+            if summary['wall'] > 0 else 0
+    return stages
+
+
+def run(sde, maps, workers):
+    """builds the database and returns the stage results"""
+    recorder = Instrumentation()
+    with tempfile.TemporaryDirectory() as directory:
+        database = Path(directory).joinpath('sde.db')
+        start = time.perf_counter()
+        with redirect_stdout(StringIO()):
+            processor = SdeParser(sde, database)
+            processor.configuration.parse_workers = workers
+            processor.instrumentation = recorder
+            with recorder.stage('tables'):
+                processor.create_table_structure()
+            processor.parse_data()
+            processor.close()
+            processor = None
+            external = ExternalParser(maps, database)
+            external.configuration.with_icebelts = True
+            external.configuration.with_triglavian_status = True
+            external.instrumentation = recorder
+            external.process()
+        total = time.perf_counter() - start
+    report = recorder.report()
+    return {'python': platform.python_version(), 'machine': platform.machine(),
+            'total': total, 'peak_rss_kib': report['peak_rss_kib'],
+            'stages': summarize(report)}
+
+
+def generate(sde_directory, maps_directory, preset, as_zip=False):
+    """
+    Writes a synthetic SDE and its region maps, it is generated on another
+    process so it doesn't count on the peak RSS. Returns where the SDE is
+    """
+    command = [sys.executable, str(GENERATOR), str(sde_directory),
+               '--preset', preset, '--maps', str(maps_directory)]
+    if as_zip:
+        command += ['--zip', str(sde_directory.with_suffix('.zip'))]
+    generation = time.perf_counter()
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    print(f'synthetic SDE ({preset}) generated in {time.perf_counter() - generation:.2f}s')
+    return sde_directory.with_suffix('.zip') if as_zip else sde_directory
+
+
+def print_results(results, baseline=None, tolerance=0.25):
+    """prints a table of the stages, returns the names of the regressed stages"""
+    regressions = []
+    print(f'{"stage":<22}{"wall s":>9}{"cpu s":>9}{"rows":>10}{"rows/s":>11}'
+          f'{"rss MiB":>9}{"vs base":>9}')
+    for name, stage in results['stages'].items():
+        compared = ''
+        previous = (baseline or {}).get('stages', {}).get(name)
+        if previous and previous['wall'] > 0:
+            ratio = stage['wall'] / previous['wall']
+            compared = f'{ratio:.2f}x'
+            # differences under 50 ms are noise
+            if ratio > 1 + tolerance and stage['wall'] - previous['wall'] > 0.05:
+                regressions.append(name)
+                compared += ' !'
+        rss = stage['peak_rss_kib'] / 1024 if stage['peak_rss_kib'] else 0
+        print(f'{name:<22}{stage["wall"]:>9.3f}{stage["cpu"]:>9.3f}{stage["rows"]:>10}'
+              f'{stage["rows_per_sec"]:>11}{rss:>9.1f}{compared:>9}')
+    print(f'total: {results["total"]:.3f}s')
+    if baseline:
+        print(f'baseline total: {baseline["total"]:.3f}s '
+              f'({results["total"] / baseline["total"]:.2f}x)')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', maxsplit=1)[0])
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--sde', type=Path, help='SDE directory or zip instead of a synthetic one')
+    parser.add_argument('--maps', type=Path, help='region maps used with --sde')
+    parser.add_argument('--zip', action='store_true', help='read the synthetic SDE from a zip')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--output', type=Path, help='write the results as JSON')
+    parser.add_argument('--case', choices=sorted(CASES), help='run a comparison of bench_*.py')
+    parser.add_argument('case_arguments', nargs='*', help='arguments of the --case comparison')
+    arguments = parser.parse_args()
+    if arguments.case:
+        sys.exit(run_case(arguments.case, arguments.case_arguments))
+
+    with tempfile.TemporaryDirectory() as work_directory:
+        sde_location = arguments.sde
+        maps_directory = arguments.maps or Path(work_directory).joinpath('maps')
+        if sde_location is None:
+            sde_location = generate(Path(work_directory).joinpath('sde'), maps_directory,
+                                    arguments.preset, arguments.zip)
+        maps_directory.mkdir(parents=True, exist_ok=True)
+        outcome = run(sde_location, maps_directory, arguments.workers)
+    outcome['preset'] = None if arguments.sde else arguments.preset
+
+    previous_run = None
+    if not arguments.save_baseline and arguments.baseline.exists():
+        with open(arguments.baseline, 'rt', encoding='UTF-8') as baseline_file:
+            previous_run = json.load(baseline_file)
+        if previous_run.get('preset') != outcome['preset']:
+            print(f'baseline was recorded with {previous_run.get("preset")}, not compared')
+            previous_run = None
+    regressed = print_results(outcome, previous_run, arguments.tolerance)
+    if arguments.output:
+        with open(arguments.output, 'wt', encoding='UTF-8') as output_file:
+            json.dump(outcome, output_file, indent=1)
+    if arguments.save_baseline:
+        with open(arguments.baseline, 'wt', encoding='UTF-8') as baseline_file:
+            json.dump(outcome, baseline_file, indent=1)
+        print(f'baseline saved on {arguments.baseline}')
+    if regressed:
+        print('regressions: ' + ', '.join(regressed))
+        sys.exit(1)
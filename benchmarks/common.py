@@ -0,0 +1,78 @@
+# -*- coding: UTF-8 -*-
+"""
+Helpers shared by the benchmark scripts: the repository root on the import
+path, the timing of a silenced call, a quiet local HTTP server and the
+registry of the comparisons that bench_suite.py runs with --case
+"""
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# comparisons registered by the bench_*.py scripts, name: (function, usage)
+CASES = {}
+
+
+def case(name, usage):
+    """
+    Registers a comparison, the function receives the command line arguments
+    (a list of strings) and it is run by bench_suite.py --case name
+    """
+    def register(function):
+        CASES[name] = (function, usage)
+        return function
+    return register
+
+
+def run_case(name, arguments):
+    """runs a registered comparison, the usage is printed when the arguments are wrong"""
+    function, usage = CASES[name]
+    try:
+        function(list(arguments))
+    except (IndexError, ValueError):
+        print(usage)
+        return 1
+    return 0
+
+
+def argument(arguments, index, default, kind=int):
+    """the argument at index converted to kind, default when it is missing"""
+    return kind(arguments[index]) if len(arguments) > index else default
+
+
+def measure(label, function, *args):
+    """
+    Runs function with its output silenced and prints the elapsed time,
+    returns the elapsed time and the result of the function
+    """
+    start = time.perf_counter()
+    with redirect_stdout(StringIO()):
+        result = function(*args)
+    elapsed = time.perf_counter() - start
+    print(f'{label:<24} {elapsed:.3f}s')
+    return elapsed, result
+
+
+def speedup(before, after, label='speedup'):
+    """prints how many times faster after is"""
+    print(f'{label}: {before / after:.2f}x')
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    """serves a directory without logging"""
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(directory, handler=QuietHandler):
+    """serves a directory on a local port, returns the server and its URL"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(handler, directory=str(directory)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/'
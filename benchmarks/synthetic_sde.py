@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""
+Writes a synthetic SDE with the layout read by SdeParser (bsd/invNames.yaml,
+fsd/categoryIDs.yaml, fsd/groupIDs.yaml, fsd/typeIDs.yaml and the universe
+tree) along with dotlan like region maps for ExternalParser. The content is
+random but reproducible for the same seed, nothing is downloaded
+
+usage: python3 benchmarks/synthetic_sde.py <output directory> [options]
+"""
+import argparse
+import random
+import zipfile
+from pathlib import Path
+import yaml
+
+try:
+    from yaml import CSafeDumper as Dumper
+except ImportError:
+    from yaml import SafeDumper as Dumper
+
+# sizes used by the benchmark suite
+PRESETS = {
+    'tiny': {'regions': 2, 'constellations': 2, 'systems': 3, 'types': 500},
+    'small': {'regions': 6, 'constellations': 4, 'systems': 6, 'types': 5000},
+    'medium': {'regions': 20, 'constellations': 6, 'systems': 8, 'types': 40000},
+    'large': {'regions': 68, 'constellations': 8, 'systems': 10, 'types': 200000},
+}
+
+STAR_TYPES = {3796: 'Sun G5 (Yellow)', 3797: 'Sun K7 (Orange)', 3798: 'Sun B0 (Blue)',
+              3799: 'Sun M0 (Red)', 3800: 'Sun A0 (Blue Small)'}
+PLANET_TYPES = (11, 12, 13, 2014, 2015, 2016)
+MOON_TYPE = 14
+GATE_TYPES = (16, 3873, 3875, 29624)
+
+
+class SyntheticSde():
+    """
+    Generator of a synthetic SDE, the sizes are the number of regions, the
+    constellations per region, the systems per constellation and so on
+    """
+
+    def __init__(self, regions=6, constellations=4, systems=6, types=5000, planets=4,
+                 moons=3, extra_gates=0.5, wormhole_regions=1, seed=1):
+        self.regions = regions
+        self.constellations = constellations
+        self.systems = systems
+        self.types = types
+        self.planets = planets
+        self.moons = moons
+        self.extra_gates = extra_gates
+        self.wormhole_regions = wormhole_regions
+        self._random = random.Random(seed)
+        self._names = []
+        self._next_item = 40000001
+        self.region_names = {}
+        self.region_systems = {}
+
+    @classmethod
+    def preset(cls, name, **kwargs):
+        """Creates a generator with one of the PRESETS sizes"""
+        return cls(**dict(PRESETS[name], **kwargs))
+
+    def _dump(self, path, content):
+        with open(path, 'wt', encoding='UTF-8') as file:
+            yaml.dump(content, file, Dumper=Dumper, allow_unicode=True)
+
+    def _point(self, scale=1e17):
+        return [self._random.uniform(-scale, scale) for _ in range(3)]
+
+    def _item_id(self):
+        self._next_item += 1
+        return self._next_item
+
+    def write(self, directory):
+        """Writes the SDE tree on the directory, returns the number of solar systems"""
+        root = Path(directory)
+        root.joinpath('bsd').mkdir(parents=True, exist_ok=True)
+        root.joinpath('fsd', 'universe').mkdir(parents=True, exist_ok=True)
+        self._write_inventory(root)
+        systems = self._write_universe(root.joinpath('fsd', 'universe', 'eve'),
+                                       10000001, 20000001, 30000001, self.regions, True)
+        systems += self._write_universe(root.joinpath('fsd', 'universe', 'wormhole'),
+                                        11000001, 21000001, 31000001,
+                                        self.wormhole_regions, False)
+        for universe in ('abyssal', 'void'):
+            root.joinpath('fsd', 'universe', universe).mkdir(exist_ok=True)
+        self._dump(root.joinpath('bsd', 'invNames.yaml'), self._names)
+        return systems
+
+    def _write_inventory(self, root):
+        self._dump(root.joinpath('fsd', 'categoryIDs.yaml'), {
+            2: {'name': {'en': 'Celestial', 'de': 'Himmelskörper'}, 'published': True},
+            6: {'name': {'en': 'Ship'}, 'published': True},
+            7: {'name': {'en': 'Module'}, 'published': True}})
+        groups = {6: {'name': {'en': 'Sun'}, 'categoryID': 2, 'anchorable': False},
+                  7: {'name': {'en': 'Planet'}, 'categoryID': 2, 'anchorable': False},
+                  8: {'name': {'en': 'Moon'}, 'categoryID': 2, 'anchorable': False},
+                  10: {'name': {'en': 'Stargate'}, 'categoryID': 2, 'anchorable': False}}
+        for group in range(100, 140):
+            groups[group] = {'name': {'en': f'Group {group}'},
+                             'categoryID': 6 if group % 2 else 7,
+                             'anchorable': group % 5 == 0}
+        self._dump(root.joinpath('fsd', 'groupIDs.yaml'), groups)
+        types = {}
+        for type_id, name in STAR_TYPES.items():
+            types[type_id] = {'groupID': 6, 'name': {'en': name}, 'published': False,
+                              'radius': 500000000.0}
+        for type_id in PLANET_TYPES:
+            types[type_id] = {'groupID': 7, 'name': {'en': f'Planet {type_id}'},
+                              'published': False, 'volume': 1.0}
+        types[MOON_TYPE] = {'groupID': 8, 'name': {'en': 'Moon'}, 'published': False}
+        for type_id in GATE_TYPES:
+            types[type_id] = {'groupID': 10, 'name': {'en': f'Stargate {type_id}'},
+                              'published': False}
+        for cont in range(self.types):
+            types[100000 + cont] = {
+                'groupID': 100 + cont % 40,
+                'name': {'en': f'Item {cont}', 'de': f'Gegenstand {cont}',
+                         'fr': f'Objet {cont}'},
+                'description': {'en': 'Synthetic item ' * 12},
+                'published': cont % 3 != 0, 'iconID': cont % 900, 'mass': 1000.0 + cont,
+                'volume': round(self._random.uniform(0.1, 500), 2), 'portionSize': 1}
+        self._dump(root.joinpath('fsd', 'typeIDs.yaml'), types)
+
+    def _write_universe(self, directory, region_id, constellation_id, system_id, regions,
+                        with_gates):
+        directory.mkdir(parents=True, exist_ok=True)
+        systems = []
+        for region in range(regions):
+            name = f'Region {region_id + region}'
+            self._names.append({'itemID': region_id + region, 'itemName': name})
+            self.region_names[region_id + region] = name
+            region_directory = directory.joinpath(name.replace(' ', ''))
+            region_directory.mkdir(exist_ok=True)
+            center = self._point()
+            content = {'regionID': region_id + region, 'center': center, 'max': center,
+                       'min': center, 'nebula': 11800 + region}
+            if with_gates:
+                content['factionID'] = 500001 + region % 4
+            else:
+                content['wormholeClassID'] = 1 + region % 6
+            self._dump(region_directory.joinpath('region.staticdata'), content)
+            for _ in range(self.constellations):
+                name = f'Constellation {constellation_id}'
+                self._names.append({'itemID': constellation_id, 'itemName': name})
+                constellation_directory = region_directory.joinpath(name.replace(' ', ''))
+                constellation_directory.mkdir(exist_ok=True)
+                center = self._point()
+                self._dump(constellation_directory.joinpath('constellation.staticdata'),
+                           {'constellationID': constellation_id, 'center': center,
+                            'max': center, 'min': center, 'radius': 1e16})
+                for _ in range(self.systems):
+                    name = f'SYS-{system_id}'
+                    self._names.append({'itemID': system_id, 'itemName': name})
+                    systems.append((system_id, constellation_directory.joinpath(name)))
+                    self.region_systems.setdefault(region_id + region, []).append(system_id)
+                    system_id += 1
+                constellation_id += 1
+        gates = self._gates(systems) if with_gates else {}
+        for solar_system_id, system_directory in systems:
+            system_directory.mkdir(exist_ok=True)
+            self._dump(system_directory.joinpath('solarsystem.staticdata'),
+                       self._solar_system(solar_system_id, gates.get(solar_system_id, {})))
+        return len(systems)
+
+    def _gates(self, systems):
+        """a ring connecting every system plus random shortcuts"""
+        links = set()
+        total = len(systems)
+        for cont in range(total if total > 1 else 0):
+            links.add(tuple(sorted((systems[cont][0], systems[(cont + 1) % total][0]))))
+        for _ in range(int(total * self.extra_gates)):
+            first, second = self._random.sample(systems, 2)
+            links.add(tuple(sorted((first[0], second[0]))))
+        gates = {}
+        for first, second in sorted(links):
+            if first == second:
+                continue
+            first_gate, second_gate = self._item_id(), self._item_id()
+            gates.setdefault(first, {})[first_gate] = {
+                'destination': second_gate, 'position': self._point(1e12),
+                'typeID': self._random.choice(GATE_TYPES)}
+            gates.setdefault(second, {})[second_gate] = {
+                'destination': first_gate, 'position': self._point(1e12),
+                'typeID': self._random.choice(GATE_TYPES)}
+        return gates
+
+    def _solar_system(self, solar_system_id, gates):
+        center = self._point()
+        planets = {}
+        for index in range(self.planets):
+            moons = {}
+            planet_id = self._item_id()
+            for _ in range(self.moons):
+                moons[self._item_id()] = {'position': self._point(1e11),
+                                          'statistics': {'radius': 1000.0},
+                                          'typeID': MOON_TYPE}
+            planets[planet_id] = {
+                'celestialIndex': index + 1, 'position': self._point(1e12),
+                'statistics': {'fragmented': False, 'locked': index % 3 == 0,
+                               'radius': self._random.uniform(1e6, 1e8)},
+                'typeID': self._random.choice(PLANET_TYPES), 'moons': moons}
+        security = round(self._random.uniform(-1, 1), 4)
+        return {'solarSystemID': solar_system_id, 'center': center,
+                'max': center, 'min': center, 'corridor': False,
+                'fringe': len(gates) == 1, 'hub': len(gates) > 3, 'international': False,
+                'luminosity': self._random.uniform(0.01, 2), 'radius': 1e13,
+                'regional': False, 'security': security, 'securityClass': 'B',
+                'stargates': gates, 'planets': planets,
+                'star': {'id': self._item_id(),
+                         'statistics': {'locked': False, 'radius': 5e8},
+                         'typeID': self._random.choice(list(STAR_TYPES))}}
+
+    def write_maps(self, directory, dotlan_names=False):
+        """
+        Writes a region map for every known space region, named '<regionId>.svg'
+        like the ones kept by ExternalParser or with the dotlan URL name
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for region_id, name in self.region_names.items():
+            if region_id >= 11000000:
+                continue
+            file_name = name.replace(' ', '_') if dotlan_names else str(region_id)
+            directory.joinpath(file_name + '.svg').write_bytes(
+                region_map(self.region_systems.get(region_id, [])))
+
+
+def region_map(system_ids):
+    """A region map with the tags read by ExternalParser"""
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<svg xmlns="http://www.w3.org/2000/svg" '
+             'xmlns:xlink="http://www.w3.org/1999/xlink">']
+    for cont, system_id in enumerate(system_ids):
+        lines.append(f'<use id="sys{system_id}" x="{cont * 37 % 1000}" '
+                     f'y="{cont * 53 % 700}" xlink:href="#def{system_id}"/>')
+        if cont % 9 == 0:
+            lines.append(f'<rect id="ice{system_id}" class="i" x="0" y="0"/>')
+    lines.append('</svg>')
+    return '\n'.join(lines).encode('UTF-8')
+
+
+def write_zip(directory, zip_file):
+    """Packs a generated SDE like sde.zip (members below 'sde/')"""
+    directory = Path(directory)
+    with zipfile.ZipFile(zip_file, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for path in sorted(directory.rglob('*')):
+            if path.is_file():
+                archive.write(path, 'sde/' + path.relative_to(directory).as_posix())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', maxsplit=1)[0])
+    parser.add_argument('output', type=Path)
+    parser.add_argument('--preset', choices=sorted(PRESETS))
+    parser.add_argument('--regions', type=int, default=6)
+    parser.add_argument('--constellations', type=int, default=4)
+    parser.add_argument('--systems', type=int, default=6)
+    parser.add_argument('--types', type=int, default=5000)
+    parser.add_argument('--planets', type=int, default=4)
+    parser.add_argument('--moons', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--maps', type=Path, help='directory for the region maps')
+    parser.add_argument('--zip', type=Path, help='also pack the SDE as a zip file')
+    arguments = parser.parse_args()
+    if arguments.preset:
+        generator = SyntheticSde.preset(arguments.preset, planets=arguments.planets,
+                                        moons=arguments.moons, seed=arguments.seed)
+    else:
+        generator = SyntheticSde(arguments.regions, arguments.constellations,
+                                 arguments.systems, arguments.types, arguments.planets,
+                                 arguments.moons, seed=arguments.seed)
+    total = generator.write(arguments.output)
+    if arguments.maps:
+        generator.write_maps(arguments.maps)
+    if arguments.zip:
+        write_zip(arguments.output, arguments.zip)
+    print(f'{total} solar systems written on {arguments.output}')
@@ -25,4 +25,43 @@ class GenericEntity():
 
     @entity_type.setter
     def entity_type(self, value):
-        self.__entity_catalog = value
\ No newline at end of file
+        self.__entity_catalog = value
+
+
+class NameIndex():
+    """
+    Keeps in memory the names of the map entities (regions, constellations and
+    solar systems), the rest of the SDE names are discarded
+    """
+    # [start, end) item ID ranges used by the map
+    ranges = ((10000000, 20000000),  # regions
+              (20000000, 30000000),  # constellations
+              (30000000, 40000000))  # solar systems
+
+    def __init__(self):
+        self.__names = {}
+
+    def __len__(self):
+        return len(self.__names)
+
+    def wanted(self, item_id):
+        """True if the item ID belongs to one of the indexed ranges"""
+        for start, end in self.ranges:
+            if start <= item_id < end:
+                return True
+        return False
+
+    def add(self, item_id, name):
+        """Stores the name if the item ID is in the indexed ranges"""
+        if self.wanted(item_id):
+            self.__names[item_id] = name
+            return True
+        return False
+
+    def items(self):
+        """Iterates over the (item ID, name) pairs"""
+        return self.__names.items()
+
+    def get(self, item_id, default=''):
+        """Returns the name of an item"""
+        return self.__names.get(item_id, default)
@@ -3,12 +3,15 @@
 """
 This script download the EVE online's Tranquility Server
 Database and discard all the non-escential data
+
+The modules used by every command are imported when the command runs,
+importing this module doesn't do any work
 """
+import argparse
+import subprocess
+import sys
+from functools import partial
 from pathlib import Path
-import shutil
-from sde_parser import SdeParser
-from misc_utils import MiscUtils
-from external_parser import ExternalParser
 
 FUZZ_DB_URL = 'https://www.fuzzwork.co.uk/dump/'
 SDE_URL = 'https://eve-static-data-export.s3-eu-west-1.amazonaws.com/tranquility/'
@@ -17,8 +20,15 @@ FUZZ_DB_NAME = 'sqlite-latest.sqlite.bz2'
 SDE_FILENAME = 'sde.zip'
 SDE_CHECKSUM = 'checksum'
 OUT_FILENAME = 'sde.db'
+MANIFEST_FILENAME = 'sde_manifest.json'
+REPORT_FILENAME = 'build_report.json'
+SNAPSHOT_DIRECTORY = 'snapshot'
+MAPS_DIRECTORY = Path('.').joinpath('maps')
 MD5_CHECKSUM = ''
-MiscUtils.chunk_size = 2391975
+# parallel byte ranges used to download sde.zip, with 1 it is hashed while it downloads
+SDE_DOWNLOAD_PARTS = 1
+DOWNLOAD_CHUNK_SIZE = 2391975
+BENCHMARK_SCRIPT = Path(__file__).resolve().parent.joinpath('benchmarks', 'bench_suite.py')
 
 source = []
 source.append(Path('.').joinpath('checksum'))
@@ -27,89 +37,375 @@ source.append(SDE_URL + SDE_CHECKSUM)
 source.append(SDE_URL + SDE_FILENAME)
 source.append(Path('.').joinpath(SDE_FILENAME))
 source.append(Path('.').joinpath(OUT_FILENAME))
+source.append(Path('.').joinpath(MANIFEST_FILENAME))
+source.append(Path('.').joinpath(REPORT_FILENAME))
 
 
-def download_control(file_name, retries=3):
+def download_control(file_name, retries=3, parts=1):
     """
-    Controls the download of file
+    Controls the download of file, every retry resumes the transfer
+    from the last byte received. Returns the bytes downloaded and the MD5
+    of the file, which is calculated while it is downloaded
     """
+    from misc_utils import MiscUtils
+    MiscUtils.chunk_size = DOWNLOAD_CHUNK_SIZE
     completed = False
     transfer_try = 0
     bytes_downloaded = 0
+    digest = None
     while transfer_try < retries and completed is False:
         try:
-            bytes_downloaded = MiscUtils.download_file(file_name)
+            bytes_downloaded, digest = MiscUtils.download_with_digest(file_name, parts=parts)
             completed = True
-        except TimeoutError:
+        except OSError as error:
+            # timeouts, connection errors and incomplete transfers
             transfer_try += 1
-            print(f'Transfer timeout, Retrying ({transfer_try}/{retries})')
-    if transfer_try == retries:
+            print(f'Transfer interrupted ({error}), Resuming ({transfer_try}/{retries})')
+    if completed is False:
         print('Maximum retries exceded, aborting...')
-    return bytes_downloaded
+    return bytes_downloaded, digest
+
+
+def read_checksum(path):
+    """the MD5 stored on a checksum file, an empty string if it is missing"""
+    if not Path(path).exists():
+        return ''
+    with open(path, 'rt', encoding='UTF-8') as md5_file:
+        fields = md5_file.read().split()
+    return fields[0] if fields else ''
 
 
-def check_md5():
+def check_md5(metrics):
     """
-    Method that download and verify SDE downloads
+    Method that download and verify SDE downloads, the downloaded checksum
+    replaces sde.md5 once sde.zip matches it
     """
-    md5_str = []
     if source[0].exists():
         print('SDE: deleting old incomplete checksum')
         source[0].unlink()
     print('SDE: Downloading MD5 Checksum ...')
-    downloaded = download_control(source[2])
+    with metrics.stage('checksum') as stage:
+        downloaded, _ = download_control(source[2])
+        stage.add_bytes(downloaded)
     print(f"SDE: Downloaded {downloaded} bytes          ")
-    for cont in range(0, 2):
-        if Path(source[cont]).exists():
-            with open(source[cont], 'rt', encoding='UTF-8') as md5_file:
-                md5_str.append(md5_file.read())
-    if len(md5_str) > 1:
-        if md5_str[0] == md5_str[1]:
-            print("SDE: The database it is already updated")
-            return True
+    expected = read_checksum(source[0])
+    if expected and expected == read_checksum(source[1]) and source[4].exists():
+        print("SDE: The database it is already updated")
+        source[0].unlink()
+        return True
     print("SDE: a new version has been detected, proceding to download")
-    if source[1].exists():
-        source[1].unlink()
-        source[0].rename(source[1])
     if source[4].exists():
         source[4].unlink()
     print('SDE: Downloading SDE database ...')
-    downloaded = download_control(source[3])
-    print(f"SDE: Downloaded {(downloaded/(1024**2)),2} Mb          ")
-    md5_str.append(MiscUtils.md5sum(source[4]))
-    if md5_str[-1] != md5_str[-2]:
-        print(md5_str[-1],md5_str[-2])
+    # the MD5 is calculated while the file is downloaded
+    with metrics.stage('download') as stage:
+        downloaded, digest = download_control(source[3], parts=SDE_DOWNLOAD_PARTS)
+        stage.add_bytes(downloaded)
+    print(f"SDE: Downloaded {downloaded / 1024**2:.2f} Mb          ")
+    if digest != expected:
+        print(digest, expected)
         print("SDE: Checksumn error, Aborting ...")
-    #    return False
+        # the previous checksum is kept, so it is downloaded again
+        return False
+    source[0].replace(source[1])
     return True
 
 
-if check_md5():
-    # we delete the uncompessed directory
-    sdePath = Path('.').joinpath('sde')
-    if sdePath.exists():
-        shutil.rmtree(sdePath)
-    if source[5].exists():
-        source[5].unlink()
-
-    # decompressing the database
-    if MiscUtils.zip_decompress(source[4], Path('.')):
-        processor = SdeParser(sdePath, source[5])
-        processor.configuration.projection_algorithm = 'isometric' #values are isometric, dimetric and none
-        processor.configuration.projected_axis = 1 # value range 0-X, 1-Y, 2-Z
-        processor.configuration.extended_coordinates = False
-        processor.configuration.map_abbysal = True
-        processor.configuration.map_kspace = True
-        processor.configuration.map_void = True
-        processor.configuration.map_wspace = True
-        processor.configuration.projection_algorithm = 'isometric' # values are 'isometric' and 'dimetric'
+def verify_sde():
+    """
+    Compares the MD5 of sde.zip with the checksum of the last download,
+    returns True when they match
+    """
+    from misc_utils import MiscUtils
+    # checksum is only left after a mismatch, it belongs to the last sde.zip downloaded
+    checksum_file = source[0] if source[0].exists() else source[1]
+    if not source[4].exists() or not checksum_file.exists():
+        print(f'SDE: {source[4]} or its checksum {checksum_file} is missing')
+        return False
+    expected = read_checksum(checksum_file)
+    digest = MiscUtils.md5sum(source[4])
+    if digest != expected:
+        print(f'SDE: {source[4]} MD5 is {digest}, expected {expected}')
+        return False
+    print(f'SDE: {source[4]} matches its checksum {digest}')
+    return True
+
+
+def configure(configuration):
+    """
+    Settings used to parse the SDE
+    """
+    configuration.projection_algorithm = 'isometric' #values are isometric, dimetric and none
+    configuration.projected_axis = 1 # value range 0-X, 1-Y, 2-Z
+    configuration.extended_coordinates = False
+    configuration.map_abbysal = True
+    configuration.map_kspace = True
+    configuration.map_void = True
+    configuration.map_wspace = True
+    configuration.parse_workers = 0 # 0 uses every core available
+    configuration.cache_directory = Path('.').joinpath('cache')
+    configuration.build_location = ':memory:' # written on sde.db once it is finished
+
+
+def build_settings():
+    """the SdeConfig used to parse the SDE"""
+    from sde_parser import SdeConfig
+    settings = SdeConfig()
+    configure(settings)
+    return settings
+
+
+def previous_manifest(settings):
+    """
+    The manifest of the last build when the database can be updated in place,
+    None when it doesn't exist or it was built with other settings
+    """
+    from manifest import BuildManifest
+    if not source[5].exists():
+        return None
+    previous = BuildManifest.load(source[6])
+    if previous is None or previous.settings != settings.settings():
+        return None
+    return previous
+
+
+def build_database(metrics, full=False):
+    """
+    Builds sde.db from sde.zip, only the changed files are parsed when the
+    manifest of the last build has the same settings (unless full is set).
+    Returns True for an incremental build, False for a full one and None
+    when there is no SDE to build from
+    """
+    from sde_parser import SdeParser
+    from manifest import BuildManifest
+    # the SDE is read straight from the zip file, nothing is extracted
+    if not source[4].exists():
+        print(f'SDE: {source[4]} not found, run the download command first')
+        return None
+    settings = build_settings()
+    # the manifest of the last build permits to parse only the changed files
+    previous = None if full else previous_manifest(settings)
+    with metrics.stage('manifest'):
+        current = BuildManifest.scan(source[4], settings.settings())
+    incremental = previous is not None
+    if not incremental:
+        # a WAL left by another database would be applied on the new one
+        for database_file in (source[5], Path(f'{source[5]}-wal'), Path(f'{source[5]}-shm')):
+            if database_file.exists():
+                database_file.unlink()
+        if source[6].exists():
+            source[6].unlink()
+    processor = SdeParser(source[4], source[5])
+    processor.instrumentation = metrics
+    configure(processor.configuration)
+    if incremental:
+        changes = previous.diff(current)
+        print(f'SDE: Incremental build, {len(changes)} files changed')
+        processor.update_data(changes, previous.entities)
+        current.merge_entities(previous, changes, processor.entity_files)
+    else:
         processor.create_table_structure()
         processor.parse_data()
-        processor.close()
-        eParser = ExternalParser(Path('.').joinpath('maps'), Path(OUT_FILENAME))
-        eParser.map_url = MAPS_URL
-        eParser.configuration.with_icebelts = True
-        eParser.configuration.with_triglavian_status = True
-        eParser.configuration.with_jove_observatories = True
-        eParser.configuration.with_special_ore = True
-        eParser.process()
+        current.entities = processor.entity_files
+    processor.close()
+    current.save(source[6])
+    return incremental
+
+
+def read_sde_regions(metrics, sde_ready=True):
+    """(regionId, regionName) of the known space regions of sde.zip"""
+    from parse_cache import ParseCache
+    from sde_source import SdeSource
+    from system_reader import read_regions
+    if not sde_ready or not source[4].exists():
+        return []
+    settings = build_settings()
+    sde = SdeSource.create(source[4])
+    try:
+        with metrics.stage('regions'):
+            return read_regions(sde, ParseCache(settings.cache_directory, settings.cache_max_size))
+    finally:
+        sde.close()
+
+
+def fetch_maps(metrics, regions):
+    """Downloads the missing dotlan maps and reads every one of them"""
+    from external_parser import read_maps
+    MAPS_DIRECTORY.mkdir(exist_ok=True)
+    with metrics.stage('maps read') as stage:
+        maps = list(read_maps(regions, MAPS_DIRECTORY, MAPS_URL))
+        stage.add_bytes(sum(map_filepath.stat().st_size for _, map_filepath, data in maps
+                            if data is not None))
+    return maps
+
+
+def read_community_data(metrics):
+    """Reads the community CSV files"""
+    from external_parser import read_community_data as read_csv_files
+    with metrics.stage('community data'):
+        return read_csv_files()
+
+
+def add_external_data(metrics, maps=None, community=None):
+    """
+    Adds the dotlan maps and the community data to sde.db, maps and
+    community are used instead of reading them again when they are given
+    """
+    from external_parser import ExternalParser
+    if not source[5].exists():
+        print(f'SDE: {source[5]} not found, run the build command first')
+        return False
+    MAPS_DIRECTORY.mkdir(exist_ok=True)
+    e_parser = ExternalParser(MAPS_DIRECTORY, Path(OUT_FILENAME))
+    e_parser.map_url = MAPS_URL
+    e_parser.instrumentation = metrics
+    e_parser.configuration.with_icebelts = True
+    e_parser.configuration.with_triglavian_status = True
+    e_parser.configuration.with_jove_observatories = True
+    e_parser.configuration.with_special_ore = True
+    e_parser.process(maps, community)
+    return True
+
+
+def update_database(metrics, sde_ready):
+    """build stage of the pipeline, None when the SDE wasn't downloaded"""
+    return build_database(metrics) if sde_ready else None
+
+
+def enrich_database(metrics, incremental, maps, community):
+    """
+    external stage of the pipeline, the maps and the community data are
+    imported again after every build so the added and removed systems
+    are up to date
+    """
+    if incremental is not None:
+        add_external_data(metrics, maps, community)
+    return incremental
+
+
+def build_pipeline(metrics):
+    """
+    Stages of the complete build: the SDE download and the database stay in
+    sequence, the region maps and the community data are read while the SDE
+    is parsed. Only the database stages write sde.db
+    """
+    from stage_scheduler import StageScheduler
+    scheduler = StageScheduler()
+    scheduler.add('download', partial(check_md5, metrics), outputs=('sde',))
+    scheduler.add('database', partial(update_database, metrics), inputs=('sde',),
+                  outputs=('incremental',), writes_database=True)
+    scheduler.add('regions', partial(read_sde_regions, metrics), inputs=('sde',),
+                  outputs=('regions',))
+    scheduler.add('maps', partial(fetch_maps, metrics), inputs=('regions',),
+                  outputs=('maps',))
+    scheduler.add('community', partial(read_community_data, metrics),
+                  outputs=('community',))
+    scheduler.add('external', partial(enrich_database, metrics),
+                  inputs=('incremental', 'maps', 'community'), writes_database=True)
+    return scheduler
+
+
+def export_snapshot(directory):
+    """
+    Writes the columnar snapshot of the map tables of sde.db on directory
+    """
+    import sqlite3
+    from snapshot_export import SnapshotExporter
+    if not source[5].exists():
+        print(f'SDE: {source[5]} not found, run the build command first')
+        return False
+    connection = sqlite3.connect(f'{source[5].resolve().as_uri()}?mode=ro', uri=True)
+    try:
+        rows = SnapshotExporter(connection).export(directory)
+    finally:
+        connection.close()
+    print(f'SDE: {rows} rows exported on {directory}')
+    return True
+
+
+def show_status():
+    """
+    Prints the files of the last download and build
+    """
+    import json
+    from manifest import BuildManifest
+    for label, path in (('checksum', source[1]), ('SDE', source[4]), ('database', source[5])):
+        if path.exists():
+            print(f'{label}: {path} ({path.stat().st_size} bytes)')
+        else:
+            print(f'{label}: {path} missing')
+    if source[1].exists():
+        print(f'MD5: {source[1].read_text(encoding="UTF-8").strip()}')
+    if source[6].exists():
+        manifest = BuildManifest.load(source[6])
+        print(f'manifest: {len(manifest.files)} files, {len(manifest.entities)} universe entities')
+    if source[7].exists():
+        with open(source[7], 'rt', encoding='UTF-8') as report_file:
+            report = json.load(report_file)
+        print(f"last build: {report['started']}, {report['wall']:.1f}s, "
+              f"{report['rows']} rows, {len(report['stages'])} stages")
+    return True
+
+
+def run_benchmarks(arguments):
+    """Runs benchmarks/bench_suite.py with the given arguments"""
+    return subprocess.run([sys.executable, str(BENCHMARK_SCRIPT)] + list(arguments),
+                          check=False).returncode == 0
+
+
+def save_report(metrics):
+    """Saves the metrics of every stage as JSON"""
+    metrics.save(source[7])
+    print(f'SDE: Build report saved on {source[7]}')
+
+
+def main(argv=None):
+    """
+    Entry point of the command line, returns the exit status. Without a
+    command the SDE is downloaded when it changed, the database is built and
+    the community data is added again
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n\n', maxsplit=1)[0])
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.add_parser('all', help='download, build and add the community data (default)')
+    commands.add_parser('download', help='download sde.zip when its checksum changed')
+    commands.add_parser('verify', help='check sde.zip against the downloaded checksum')
+    build = commands.add_parser('build', help='build or update sde.db from sde.zip')
+    build.add_argument('--full', action='store_true', help='ignore the manifest of the last build')
+    commands.add_parser('external', help='add the dotlan maps and the community data to sde.db')
+    export = commands.add_parser('export', help='write the columnar snapshot of sde.db')
+    export.add_argument('directory', nargs='?', type=Path, default=Path(SNAPSHOT_DIRECTORY))
+    commands.add_parser('status', help='show the files of the last download and build')
+    commands.add_parser('bench', add_help=False,
+                        help='run benchmarks/bench_suite.py, the arguments are passed on')
+    arguments, extra = parser.parse_known_args(argv)
+    command = arguments.command or 'all'
+    if extra and command != 'bench':
+        parser.error(f'unrecognized arguments: {" ".join(extra)}')
+
+    if command == 'verify':
+        return 0 if verify_sde() else 1
+    if command == 'status':
+        return 0 if show_status() else 1
+    if command == 'export':
+        return 0 if export_snapshot(arguments.directory) else 1
+    if command == 'bench':
+        return 0 if run_benchmarks(extra) else 1
+
+    from instrumentation import Instrumentation
+    # metrics of every stage, saved as JSON at the end
+    metrics = Instrumentation()
+    if command == 'download':
+        done = check_md5(metrics)
+    elif command == 'build':
+        done = build_database(metrics, arguments.full) is not None
+    elif command == 'external':
+        done = add_external_data(metrics)
+    else:
+        done = build_pipeline(metrics).run().get('incremental') is not None
+    save_report(metrics)
+    return 0 if done else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,6 +6,7 @@
 Provides a conosolidated way to access databases
 """
 import enum
+import os
 import sqlite3
 from pathlib import Path
 
@@ -24,6 +25,9 @@ class DatabaseDriver:
     __database_type = None
     __data_source = None
     __connection = None
+    __bulk_load = False
+    __deferred_indexes = None
+    __build_location = None
 
     # Propiedades
     @property
@@ -61,6 +65,21 @@ class DatabaseDriver:
         """
         return self.__connection
 
+    @property
+    def build_location(self):
+        """
+        Where the database is being built (':memory:' or a file) until it is
+        published, None when the connection is to the database file
+        """
+        return self.__build_location
+
+    @property
+    def bulk_load(self):
+        """
+        True while a bulk load session is active
+        """
+        return self.__bulk_load
+
     # Constructor
     def __init__(self, database_type=DatabaseType.NONE, datasource_string=None):
         if not isinstance(database_type, DatabaseType):
@@ -68,6 +87,7 @@ class DatabaseDriver:
         if database_type is database_type.NONE:
             raise NotImplementedError
         self.__database_type = database_type
+        self.__deferred_indexes = []
         if datasource_string is not None:
             self.data_source = datasource_string
 
@@ -83,3 +103,123 @@ class DatabaseDriver:
     def __create_connection(self, datasource_string):
         if self.database_type == DatabaseType.SQLITE:
             self.__connection = sqlite3.connect(self.__data_source.resolve())
+
+    def begin_bulk_load(self, cache_size=262144, journal_mode='MEMORY'):
+        """
+        Starts a bulk load session: journal in memory (or off), no synchronous writes,
+        a big page cache (in KiB), exclusive locking and one enclosing transaction,
+        secondary indexes are deferred until the session ends
+        """
+        if self.__bulk_load:
+            return
+        if self.database_type == DatabaseType.SQLITE:
+            self.__connection.commit()
+            cur = self.__connection.cursor()
+            cur.execute(f'PRAGMA journal_mode={journal_mode};')
+            cur.execute('PRAGMA synchronous=OFF;')
+            cur.execute(f'PRAGMA cache_size=-{int(cache_size)};')
+            cur.execute('PRAGMA locking_mode=EXCLUSIVE;')
+            cur.execute('PRAGMA temp_store=MEMORY;')
+            cur.execute('BEGIN;')
+            cur.close()
+        self.__bulk_load = True
+
+    def end_bulk_load(self, journal_mode='DELETE'):
+        """
+        Creates the deferred indexes, commits the session transaction and
+        restores the durable settings, the database is left with the given
+        journal mode (WAL lets readers work while it is written)
+        """
+        if not self.__bulk_load:
+            return
+        if self.database_type == DatabaseType.SQLITE:
+            cur = self.__connection.cursor()
+            for query in self.__deferred_indexes:
+                cur.execute(query)
+            self.__deferred_indexes.clear()
+            self.__connection.commit()
+            cur.execute('PRAGMA journal_mode=DELETE;')
+            cur.execute('PRAGMA synchronous=FULL;')
+            cur.execute('PRAGMA cache_size=-2000;')
+            cur.execute('PRAGMA temp_store=DEFAULT;')
+            cur.execute('PRAGMA locking_mode=NORMAL;')
+            # the exclusive lock is released on the next access to the database
+            cur.execute('SELECT count(*) FROM sqlite_master;')
+            cur.fetchall()
+            # WAL is enabled without the exclusive lock so it uses the shared memory index
+            if journal_mode.upper() != 'DELETE':
+                cur.execute(f'PRAGMA journal_mode={journal_mode};')
+            cur.close()
+        self.__bulk_load = False
+
+    def create_index(self, query):
+        """
+        Executes a CREATE INDEX statement, during a bulk load session
+        it is deferred until the data is loaded
+        """
+        if self.__bulk_load:
+            self.__deferred_indexes.append(query)
+            return
+        cur = self.__connection.cursor()
+        cur.execute(query)
+        cur.close()
+
+    def commit(self):
+        """
+        Commits the current transaction, during a bulk load session the
+        commit is done when the session ends
+        """
+        if not self.__bulk_load:
+            self.__connection.commit()
+
+    def relocate(self, location=':memory:', page_size=None):
+        """
+        Moves the database to memory (':memory:') or to a file on another
+        directory (e.g. a tmpfs) until it is published, the current content
+        is copied with the backup API. page_size only applies to a new database
+        """
+        if self.__build_location is not None or self.database_type != DatabaseType.SQLITE:
+            return
+        if location == ':memory:':
+            target = location
+        else:
+            target = Path(location).joinpath(self.__data_source.name + '.build')
+            if target.exists():
+                target.unlink()
+        connection = sqlite3.connect(target)
+        self.__connection.commit()
+        tables = self.__connection.execute('SELECT count(*) FROM sqlite_master;').fetchone()[0]
+        if tables > 0:
+            # the copy keeps the page size of the existing database
+            self.__connection.backup(connection)
+        elif page_size is not None:
+            connection.execute(f'PRAGMA page_size={int(page_size)};')
+        self.__connection.close()
+        self.__connection = connection
+        self.__build_location = target
+
+    def publish(self, journal_mode='DELETE'):
+        """
+        Writes a relocated database on its file in one pass with VACUUM INTO,
+        the file is replaced at once and the driver connects to it again
+        """
+        if self.__build_location is None:
+            return
+        self.__connection.commit()
+        temporary = self.__data_source.with_name(self.__data_source.name + '.part')
+        if temporary.exists():
+            temporary.unlink()
+        self.__connection.execute('VACUUM INTO ?;', (str(temporary.resolve()),))
+        self.__connection.close()
+        if self.__build_location != ':memory:':
+            Path(self.__build_location).unlink()
+        # a WAL of the replaced file would be applied on the new one
+        for suffix in ('-wal', '-shm'):
+            stale = Path(f'{self.__data_source}{suffix}')
+            if stale.exists():
+                stale.unlink()
+        os.replace(temporary, self.__data_source)
+        self.__build_location = None
+        self.__create_connection(self.__data_source)
+        if journal_mode.upper() != 'DELETE':
+            self.__connection.execute(f'PRAGMA journal_mode={journal_mode};')
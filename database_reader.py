@@ -0,0 +1,146 @@
+# -*- coding: UTF-8 -*-
+"""
+Provides the read side of a built database for multi-threaded services, a
+pool of read-only connections that any thread can check out, e.g.
+
+    pool = ReaderPool('sde.db', size=16)
+    with pool.connection() as connection:
+        connection.execute('SELECT ...')
+"""
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class PoolTimeoutError(Exception):
+    """
+    No connection of the pool was returned before the timeout
+    """
+
+
+class PoolClosedError(Exception):
+    """
+    The pool was closed, it doesn't give connections anymore
+    """
+
+
+class ReaderPool():
+    """
+    Thread-safe pool of read-only SQLite connections (mode=ro), created when
+    needed up to size. With WAL the readers don't block each other nor the
+    writer, a database that doesn't change can be opened as immutable to
+    skip the locking completely
+    """
+
+    @property
+    def size(self):
+        """maximum number of connections"""
+        return self._size
+
+    @property
+    def created(self):
+        """connections opened so far"""
+        return self._created
+
+    def __init__(self, database_file, size=8, immutable=False, cached_statements=256,
+                 mmap_size=256 * 1024**2, timeout=30.0):
+        path = Path(database_file).resolve()
+        if not path.is_file():
+            raise FileNotFoundError(f'The database {path} does not exists.')
+        self._uri = f'{path.as_uri()}?mode=ro'
+        if immutable:
+            self._uri += '&immutable=1'
+        self._size = size
+        self._cached_statements = cached_statements
+        self._mmap_size = mmap_size
+        self._timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _connect(self):
+        # the pool makes sure only one thread uses a connection at a time
+        connection = sqlite3.connect(self._uri, uri=True, check_same_thread=False,
+                                     cached_statements=self._cached_statements)
+        cur = connection.cursor()
+        cur.execute(f'PRAGMA mmap_size={int(self._mmap_size)};')
+        cur.execute('PRAGMA query_only=ON;')
+        cur.close()
+        return connection
+
+    def acquire(self, timeout=None):
+        """
+        Checks out a connection, it waits up to timeout seconds (the pool
+        timeout by default) when every connection is in use
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._closed:
+                raise PoolClosedError('The connection pool is closed.')
+            create = self._created < self._size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return self._connect()
+            except sqlite3.Error:
+                with self._lock:
+                    self._created -= 1
+                raise
+        timeout = self._timeout if timeout is None else timeout
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty as error:
+            raise PoolTimeoutError(f'No connection was available in {timeout}s.') from error
+
+    def release(self, connection):
+        """Returns a connection to the pool"""
+        if connection.in_transaction:
+            connection.rollback()
+        with self._lock:
+            if not self._closed:
+                self._idle.put(connection)
+                return
+            self._created -= 1
+        connection.close()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Checks out a connection for the with block"""
+        connection = self.acquire(timeout)
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def execute(self, query, parameters=()):
+        """Runs a query on a pooled connection and returns every row"""
+        with self.connection() as connection:
+            return connection.execute(query, parameters).fetchall()
+
+    def close(self):
+        """
+        Closes the idle connections, the ones in use are closed when they
+        are returned
+        """
+        with self._lock:
+            self._closed = True
+            while True:
+                try:
+                    connection = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                connection.close()
+                self._created -= 1
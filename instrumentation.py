@@ -0,0 +1,119 @@
+# -*- coding: UTF-8 -*-
+"""
+Provides the metrics of every stage of a build (wall and CPU time, rows
+written, bytes read and peak memory) and a JSON report of the whole run
+"""
+import json
+import platform
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class StageMetrics():
+    """Metrics of a single stage, the code running it adds the bytes read"""
+
+    def __init__(self, name):
+        self.name = name
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.rows = 0
+        self.bytes_read = 0
+        self.peak_rss_kib = None
+
+    def add_bytes(self, size):
+        """adds the size of a file read (or downloaded) by the stage"""
+        self.bytes_read += size
+
+    def add_rows(self, rows):
+        """adds rows written without the instrumented connection"""
+        self.rows += rows
+
+    def as_dict(self):
+        """the metrics as a JSON serializable dict"""
+        return {'name': self.name, 'wall': round(self.wall, 6), 'cpu': round(self.cpu, 6),
+                'rows': self.rows,
+                'rows_per_sec': round(self.rows / self.wall) if self.wall > 0 else 0,
+                'bytes_read': self.bytes_read, 'peak_rss_kib': self.peak_rss_kib}
+
+
+class Instrumentation():
+    """
+    Records the metrics of the stages in the order they run, the rows of a stage
+    are the changes made by the database connection given to it
+    """
+
+    @staticmethod
+    def peak_rss():
+        """peak resident memory in KiB of this process and its finished workers"""
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        if sys.platform == 'darwin':
+            # macOS reports bytes
+            peak, children = peak // 1024, children // 1024
+        return max(peak, children)
+
+    @staticmethod
+    def cpu_time():
+        """CPU seconds used by this process and its finished workers"""
+        if resource is None:
+            return time.process_time()
+        total = 0.0
+        for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+            usage = resource.getrusage(who)
+            total += usage.ru_utime + usage.ru_stime
+        return total
+
+    @property
+    def stages(self):
+        """the metrics of every finished stage"""
+        return list(self._stages)
+
+    def __init__(self):
+        self._stages = []
+        self._started = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self._start_cpu = self.cpu_time()
+
+    @contextmanager
+    def stage(self, name, connection=None):
+        """
+        Measures the code executed inside the with block as a stage, the
+        metrics are recorded even if the stage fails
+        """
+        metrics = StageMetrics(name)
+        changes = connection.total_changes if connection is not None else 0
+        wall, cpu = time.perf_counter(), self.cpu_time()
+        try:
+            yield metrics
+        finally:
+            metrics.wall = time.perf_counter() - wall
+            metrics.cpu = self.cpu_time() - cpu
+            if connection is not None:
+                metrics.rows += connection.total_changes - changes
+            metrics.peak_rss_kib = self.peak_rss()
+            self._stages.append(metrics)
+
+    def report(self):
+        """the whole run as a JSON serializable dict"""
+        return {'started': self._started.isoformat(timespec='seconds'),
+                'wall': round(time.perf_counter() - self._start, 6),
+                'cpu': round(self.cpu_time() - self._start_cpu, 6),
+                'peak_rss_kib': self.peak_rss(),
+                'rows': sum(stage.rows for stage in self._stages),
+                'bytes_read': sum(stage.bytes_read for stage in self._stages),
+                'python': platform.python_version(),
+                'stages': [stage.as_dict() for stage in self._stages]}
+
+    def save(self, path):
+        """Writes the report as JSON"""
+        with open(path, 'wt', encoding='UTF-8') as file:
+            json.dump(self.report(), file, indent=1)
@@ -0,0 +1,96 @@
+# -*- coding: UTF-8 -*-
+"""
+Provides a manifest of the SDE files used to build the database,
+it permits to detect what changed between two SDE releases
+"""
+import json
+from pathlib import Path
+from sde_source import SdeSource
+
+
+class ManifestDiff():
+    """Files added, changed and removed between two manifests"""
+
+    def __init__(self, added, changed, removed):
+        self.added = sorted(added)
+        self.changed = sorted(changed)
+        self.removed = sorted(removed)
+
+    @property
+    def modified(self):
+        """files that need to be parsed again (added or changed)"""
+        return sorted(self.added + self.changed)
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+    def __len__(self):
+        return len(self.added) + len(self.changed) + len(self.removed)
+
+
+class BuildManifest():
+    """
+    Digest of every SDE file used by SdeParser, along with the configuration
+    used for the build and the entity ID stored on every universe file
+    """
+    # files read by SdeParser relative to the SDE directory
+    sde_files = ('bsd/invNames.yaml', 'fsd/categoryIDs.yaml',
+                 'fsd/groupIDs.yaml', 'fsd/typeIDs.yaml')
+    universe_directory = 'fsd/universe'
+
+    def __init__(self, files=None, settings=None, entities=None):
+        self.files = files if files is not None else {}
+        self.settings = settings if settings is not None else {}
+        self.entities = entities if entities is not None else {}
+
+    @classmethod
+    def scan(cls, source, settings=None):
+        """
+        Creates a manifest with the digest of the SDE files of a source (an
+        SdeSource, an extracted directory or sde.zip)
+        """
+        if not isinstance(source, SdeSource):
+            source = SdeSource.create(source)
+        files = {}
+        for name in cls.sde_files:
+            if source.exists(name):
+                files[name] = source.digest(name)
+        for name in source.list_files(cls.universe_directory, '.staticdata'):
+            files[name] = source.digest(name)
+        return cls(files, settings)
+
+    @classmethod
+    def load(cls, path):
+        """Loads a manifest saved by a previous build, None if it doesn't exist"""
+        path = Path(path)
+        if not path.is_file():
+            return None
+        with open(path, 'rt', encoding='UTF-8') as file:
+            content = json.load(file)
+        return cls(content.get('files'), content.get('settings'), content.get('entities'))
+
+    def save(self, path):
+        """Saves the manifest as JSON"""
+        content = {'settings': self.settings, 'files': self.files, 'entities': self.entities}
+        with open(path, 'wt', encoding='UTF-8') as file:
+            json.dump(content, file, indent=1, sort_keys=True)
+
+    def diff(self, current):
+        """
+        Compares this (previous) manifest against the current one
+        """
+        added = [name for name in current.files if name not in self.files]
+        removed = [name for name in self.files if name not in current.files]
+        changed = [name for name, digest in current.files.items()
+                   if name in self.files and self.files[name] != digest]
+        return ManifestDiff(added, changed, removed)
+
+    def merge_entities(self, previous, diff, parsed):
+        """
+        Keeps the entity IDs of the previous build that weren't removed
+        and adds the ones parsed in this build
+        """
+        removed = set(diff.removed)
+        self.entities = {name: value for name, value in previous.entities.items()
+                         if name not in removed}
+        self.entities.update(parsed)
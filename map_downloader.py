@@ -0,0 +1,109 @@
+# -*- coding: UTF-8 -*-
+"""
+Provides a concurrent downloader for the dotlan region maps, every
+download shares the same keep-alive session and connection pool
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class RateLimiter():
+    """
+    Keeps a minimum interval between the requests sent to the same host,
+    the slots are reserved under a lock so the threads never wait on each other
+    """
+
+    def __init__(self, requests_per_second=0):
+        self._interval = 1 / requests_per_second if requests_per_second > 0 else 0
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, host):
+        """Blocks until a request to the host can be sent"""
+        if self._interval == 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self._interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class MapDownloader():
+    """
+    Downloads files on a bounded thread pool, the results are returned as soon
+    as every download finishes so the caller can process them meanwhile
+    """
+    chunk_size = 65536
+
+    @property
+    def session(self):
+        """the HTTP session shared by every download"""
+        return self._session
+
+    def __init__(self, max_workers=4, requests_per_second=0, timeout=60):
+        self._max_workers = max(1, max_workers)
+        self._timeout = timeout
+        self._limiter = RateLimiter(requests_per_second)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self._max_workers)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Closes the pooled connections"""
+        self._session.close()
+
+    def download(self, url, file_path):
+        """
+        Download a single file, it returns the bytes written or 0 if the server
+        doesn't return the file. The file is written with a temporary name first
+        so an interrupted download never leaves a partial map
+        """
+        file_path = Path(file_path)
+        self._limiter.wait(urlparse(url).netloc)
+        with self._session.get(url, stream=True, timeout=self._timeout) as response:
+            if response.status_code != 200:
+                return 0
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = file_path.with_name(f'{file_path.name}.{threading.get_ident()}.part')
+            bytes_downloaded = 0
+            try:
+                with open(temp_path, 'wb') as file:
+                    for chunk in response.iter_content(self.chunk_size):
+                        bytes_downloaded += file.write(chunk)
+                os.replace(temp_path, file_path)
+            finally:
+                if temp_path.exists():
+                    temp_path.unlink()
+        return bytes_downloaded
+
+    def download_all(self, jobs):
+        """
+        Download every (key, url, file path) job and yield (key, file path, bytes)
+        in completion order, a failed download yields 0 bytes
+        """
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            futures = {executor.submit(self.download, url, file_path): (key, file_path)
+                       for key, url, file_path in jobs}
+            for future in as_completed(futures):
+                key, file_path = futures[future]
+                try:
+                    bytes_downloaded = future.result()
+                except (requests.RequestException, OSError) as error:
+                    print(f'Dotlan: download failed for {file_path} ({error})')
+                    bytes_downloaded = 0
+                yield key, file_path, bytes_downloaded
@@ -3,17 +3,27 @@
 Provide a wide range of tools to download and.
 decompress files from internet
 """
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import glob
+import json
+import os
+import threading
 import zipfile
 import bz2
 import hashlib
 from functools import partial
 import classutilities
-import requests
+
+
+class IncompleteDownloadError(IOError):
+    """The transfer ended before receiving the whole file"""
 
 
 class MiscUtils(object):
     __chunk_size = 2391975
+    # read size used to hash files already on disk
+    digest_buffer_size = 1024**2
 
     @classutilities.classproperty
     def chunk_size(cls):
@@ -26,39 +36,247 @@ class MiscUtils(object):
 
     @classmethod
     # TODO: Convertir este metodo en algo mas adecuado para uso de clases
-    def download_file(cls, url, filename=None):
+    def download_file(cls, url, filename=None, parts=1):
+        """
+        Download a file from Internet, see download_with_digest
+        """
+        return cls.download_with_digest(url, filename, parts, None)[0]
+
+    @classmethod
+    def download_with_digest(cls, url, filename=None, parts=1, algorithm='md5'):
         """
         Download a file from Internet, but it assumes it should be on the current path
-        and no other parameters are present on the url. This methond doesn't overwrite files,
-        so you need to be sure that file doesn't exists before download anything.
+        and no other parameters are present on the url. The data is written to
+        '<file>.part' and renamed when it is complete, if a previous transfer was
+        interrupted it resumes from the last byte received with a HTTP Range request.
+        With parts > 1 big files are downloaded in parallel byte ranges.
+        The file is hashed while it is written, it returns the bytes downloaded
+        and the hex digest (None when the download failed or algorithm is None)
         """
         file_path = ""
-        total_length = 0
         if isinstance(filename, str):
             file_path = Path('.').joinpath(filename)
         else:
             # TODO: implement a way to discard any no-esscential parameter from url
-            file_path = url.split('/')[-1]
-        # check if URL exists
-        r = requests.head(url, allow_redirects=True, timeout=500)
-        if r.status_code == 200:
-            request_obj = requests.get(url, stream=True, timeout=500)
-            with open(file_path, "wb") as zip_file:
-                total_length = 0
-                bytes_downloaded = 0
-                downloaded_percent = "--"
-                if request_obj.headers.get('content-length') is not None:
-                    total_length = int(request_obj.headers.get('content-length'))
+            file_path = Path(url.split('/')[-1])
+        if parts > 1:
+            result = cls._download_ranges(url, file_path, parts, algorithm)
+            if result is not None:
+                return result
+        return cls._download_resumable(url, file_path, algorithm)
+
+    @staticmethod
+    def _part_path(file_path, suffix='part'):
+        return file_path.with_name(f'{file_path.name}.{suffix}')
+
+    @classmethod
+    def _load_part_info(cls, file_path):
+        """validators (ETag, Last-Modified and length) of the interrupted transfer"""
+        info_path = cls._part_path(file_path, 'part.json')
+        if not info_path.exists():
+            return {}
+        try:
+            with open(info_path, 'rt', encoding='UTF-8') as info_file:
+                return json.load(info_file)
+        except ValueError:
+            return {}
+
+    @classmethod
+    def _save_part_info(cls, file_path, info):
+        with open(cls._part_path(file_path, 'part.json'), 'wt', encoding='UTF-8') as info_file:
+            json.dump(info, info_file)
+
+    @classmethod
+    def _discard_parts(cls, file_path):
+        """removes every temporary file of a transfer"""
+        for part in file_path.parent.glob(f'{glob.escape(file_path.name)}.part*'):
+            part.unlink()
+
+    @staticmethod
+    def _response_info(response, length):
+        return {'etag': response.headers.get('etag'),
+                'last_modified': response.headers.get('last-modified'),
+                'length': length}
+
+    @staticmethod
+    def _validator(info):
+        return info.get('etag') or info.get('last_modified')
+
+    @staticmethod
+    def _content_range(response):
+        """returns the (first byte, total length) of a 206 response"""
+        content_range = response.headers.get('content-range', '')
+        try:
+            first_byte = int(content_range.split(' ')[1].split('-')[0])
+            total = content_range.split('/')[1]
+            return first_byte, None if total == '*' else int(total)
+        except (IndexError, ValueError):
+            return None, None
+
+    @classmethod
+    def _finish(cls, file_path, part_path, expected):
+        """checks the length of the transfer and moves it to its final name"""
+        received = part_path.stat().st_size
+        if expected is not None and received != expected:
+            raise IncompleteDownloadError(f'{file_path}: {received} of {expected} bytes received')
+        os.replace(part_path, file_path)
+        cls._discard_parts(file_path)
+        return received
+
+    @classmethod
+    def _received_bytes(cls, file_path, info):
+        """bytes received by an interrupted transfer over a single connection"""
+        part_path = cls._part_path(file_path)
+        if not info or not part_path.exists():
+            return 0
+        if info.get('ranges') is not None:
+            # the preallocated file of a ranged transfer, its size isn't what was received
+            cls._discard_parts(file_path)
+            return 0
+        return part_path.stat().st_size
+
+    @classmethod
+    def _range_headers(cls, offset, info):
+        """headers that ask for the bytes after offset when the file didn't change"""
+        if offset == 0:
+            return {}
+        headers = {'Range': f'bytes={offset}-'}
+        if cls._validator(info) is not None:
+            headers['If-Range'] = cls._validator(info)
+        return headers
+
+    @classmethod
+    def _resume_point(cls, response, offset, info):
+        """
+        Checks the answer to a request, returns the (offset, file mode, total
+        length) used to write it or None when the transfer has to start again
+        """
+        if response.status_code == 206:
+            first_byte, total_length = cls._content_range(response)
+            if first_byte != offset or total_length != info.get('length') or \
+               response.headers.get('etag', info.get('etag')) != info.get('etag'):
+                # the file changed on the server
+                return None
+            return offset, 'ab', total_length
+        if response.status_code == 200:
+            # the server ignored the range (or the file changed)
+            length = response.headers.get('content-length')
+            return 0, 'wb', int(length) if length is not None else None
+        # 416, the range doesn't match the file any more
+        return None
+
+    @classmethod
+    def _write_response(cls, response, part_path, mode, offset, total_length, digest):
+        """writes the body of a response on the part file, the digest is updated with it"""
+        with open(part_path, mode) as zip_file:
+            bytes_downloaded = offset
+            downloaded_percent = "--"
+            for chunk in response.iter_content(cls.chunk_size):
+                if chunk:
+                    zip_file.write(chunk)
+                    if digest is not None:
+                        digest.update(chunk)
+                    bytes_downloaded += len(chunk)
+                    downloaded_kb = round(bytes_downloaded / 1024)
+                    if total_length:
+                        downloaded_percent = round((bytes_downloaded / total_length) * 100, 2)
+                    print(f'Downloading: {downloaded_kb} kb [{downloaded_percent}%]\r', end="")
+
+    @classmethod
+    def _download_resumable(cls, url, file_path, algorithm):
+        # requests is only loaded when something is downloaded
+        import requests
+        part_path = cls._part_path(file_path)
+        info = cls._load_part_info(file_path)
+        offset = cls._received_bytes(file_path, info)
+        with requests.get(url, stream=True, timeout=500,
+                          headers=cls._range_headers(offset, info)) as request_obj:
+            if request_obj.status_code == 416 and offset == info.get('length'):
+                # the previous transfer already received every byte
+                return (cls._finish(file_path, part_path, offset),
+                        cls.file_digest(file_path, algorithm) if algorithm else None)
+            if request_obj.status_code not in (200, 206, 416):
+                return 0, None
+            resume = cls._resume_point(request_obj, offset, info)
+            if resume is None:
+                request_obj.close()
+                cls._discard_parts(file_path)
+                return cls._download_resumable(url, file_path, algorithm)
+            offset, mode, total_length = resume
+            digest = hashlib.new(algorithm) if algorithm else None
+            if digest is not None and mode == 'ab':
+                # the bytes received by the previous transfer
+                cls._update_digest(digest, part_path)
+            cls._save_part_info(file_path, cls._response_info(request_obj, total_length))
+            cls._write_response(request_obj, part_path, mode, offset, total_length, digest)
+        return (cls._finish(file_path, part_path, total_length),
+                digest.hexdigest() if digest is not None else None)
+
+    @classmethod
+    def _download_ranges(cls, url, file_path, parts, algorithm):
+        """
+        Download the file as parallel byte ranges, every range is written at its
+        offset of a preallocated '.part' file and the bytes it received are kept
+        on '.part.json' so it can be resumed. The file is hashed once it is
+        complete. Returns None if the server doesn't accept ranges or the file
+        is too small to be split
+        """
+        import requests
+        head = requests.head(url, allow_redirects=True, timeout=500)
+        total_length = int(head.headers.get('content-length') or 0)
+        if head.status_code != 200 or head.headers.get('accept-ranges') != 'bytes' or \
+           total_length < parts * cls.chunk_size:
+            return None
+        info = cls._response_info(head, total_length)
+        previous = cls._load_part_info(file_path)
+        part_path = cls._part_path(file_path)
+        if previous.get('length') != info['length'] or \
+           cls._validator(previous) != cls._validator(info) or \
+           len(previous.get('ranges') or ()) != parts or not part_path.exists():
+            cls._discard_parts(file_path)
+            previous = {'ranges': [0] * parts}
+            with open(part_path, 'wb') as zip_file:
+                zip_file.truncate(total_length)
+        info['ranges'] = previous['ranges']
+        cls._save_part_info(file_path, info)
+        part_size = -(-total_length // parts)
+        ranges = [(part, part * part_size, min(total_length, (part + 1) * part_size) - 1)
+                  for part in range(parts)]
+        lock = threading.Lock()
+        with ThreadPoolExecutor(max_workers=parts) as executor:
+            futures = [executor.submit(cls._download_range, url, file_path, info, lock,
+                                       *byte_range) for byte_range in ranges]
+            for future in futures:
+                future.result()
+        received = cls._finish(file_path, part_path, total_length)
+        return received, cls.file_digest(file_path, algorithm) if algorithm else None
+
+    @classmethod
+    def _download_range(cls, url, file_path, info, lock, part, first_byte, last_byte):
+        import requests
+        offset = first_byte + info['ranges'][part]
+        if offset > last_byte:
+            return
+        headers = {'Range': f'bytes={offset}-{last_byte}'}
+        if cls._validator(info) is not None:
+            headers['If-Range'] = cls._validator(info)
+        with requests.get(url, stream=True, timeout=500, headers=headers) as request_obj:
+            if request_obj.status_code != 206 or \
+               cls._content_range(request_obj)[0] != offset:
+                raise IncompleteDownloadError(f'{url}: range request was not honored')
+            with open(cls._part_path(file_path), 'r+b') as zip_file:
+                zip_file.seek(offset)
                 for chunk in request_obj.iter_content(cls.chunk_size):
-                    if chunk:
-                        zip_file.write(chunk)
-                        bytes_downloaded += len(chunk)
-                        downloaded_kb = round(bytes_downloaded / 1024)
-                        if total_length > 0:
-                            downloaded_percent = round((bytes_downloaded / total_length) * 100, 2)
-                        print(f'Downloading: {downloaded_kb} kb [{downloaded_percent}%]\r', end="")
-            return bytes_downloaded
-        return 0
+                    zip_file.write(chunk[:last_byte + 1 - offset])
+                    offset = min(offset + len(chunk), last_byte + 1)
+                    # the bytes are written before they are recorded as received
+                    zip_file.flush()
+                    with lock:
+                        info['ranges'][part] = offset - first_byte
+                        cls._save_part_info(file_path, info)
+        if offset != last_byte + 1:
+            raise IncompleteDownloadError(f'{file_path}: range {first_byte}-{last_byte} '
+                                          f'stopped at {offset}')
 
     @classmethod
     def bz2_decompress(cls, compressed_filepath, uncompressed_filepath):
@@ -97,14 +315,26 @@ class MiscUtils(object):
         except zipfile.BadZipFile:
             return False
 
+    @classmethod
+    def _update_digest(cls, digest, filename):
+        """feeds a whole file to a hash object reusing a single large buffer"""
+        buffer = bytearray(cls.digest_buffer_size)
+        view = memoryview(buffer)
+        with open(filename, mode='rb', buffering=0) as f:
+            for size in iter(partial(f.readinto, buffer), 0):
+                digest.update(view[:size])
+        return digest
+
+    @classmethod
+    def file_digest(cls, filename, algorithm='md5'):
+        """
+        Calculate the checksum of a file already on disk
+        """
+        return cls._update_digest(hashlib.new(algorithm), filename).hexdigest()
+
     @classmethod
     def md5sum(cls, filename):
         """
-        Calculate MD5 checksum for file, this is not needed in 3.11 or later 
-        because it has a native function
+        Calculate MD5 checksum for file
         """
-        with open(filename, mode='rb') as f:
-            d = hashlib.md5()
-            for buf in iter(partial(f.read, 128), b''):
-                d.update(buf)
-        return d.hexdigest()
+        return cls.file_digest(filename, 'md5')
@@ -0,0 +1,154 @@
+# -*- coding: UTF-8 -*-
+"""
+Provides an on-disk cache of the parsed SDE YAML files, so a build that
+only changes the configuration doesn't need to parse the YAML again
+"""
+import hashlib
+import os
+import pickle
+import threading
+from pathlib import Path
+from yaml_stream import YamlStream
+
+
+class ParseCache():
+    """
+    Stores the Python structures of every parsed file as pickles named after the
+    file name and the digest given by its SdeSource. When the cache is disabled
+    (no directory) every method falls back to plain YAML parsing
+    """
+    _directory = None
+    _max_size = 1024**3
+
+    @property
+    def enabled(self):
+        """True if a cache directory was configured"""
+        return self._directory is not None
+
+    @property
+    def directory(self):
+        """the directory where the cache entries are stored"""
+        return self._directory
+
+    def __init__(self, directory=None, max_size=1024**3):
+        if directory is not None:
+            self._directory = Path(directory)
+            self._directory.mkdir(parents=True, exist_ok=True)
+        self._max_size = max_size
+
+    def _digest(self, source, name):
+        """
+        Content digest of a file, the digest of a directory file is kept on a
+        small entry keyed by its signature so it is hashed only when it changes
+        """
+        signature = source.signature(name)
+        if signature is None:
+            return source.cache_digest(name)
+        entry = self._directory.joinpath(
+            hashlib.sha1(signature.encode('UTF-8')).hexdigest() + '.digest')
+        try:
+            digest = entry.read_text(encoding='ascii')
+            os.utime(entry)
+            return digest
+        except OSError:
+            pass
+        digest = source.cache_digest(name)
+        self._write(entry, digest.encode('ascii'))
+        return digest
+
+    def _entry(self, kind, source, name):
+        # the name is part of the key, two files never share an entry
+        key = hashlib.sha1(f'{name}:{self._digest(source, name)}'.encode('UTF-8')).hexdigest()
+        return self._directory.joinpath(f'{key}-{source.size(name)}.{kind}')
+
+    @staticmethod
+    def _temporary(entry):
+        """temporary file of an entry, unique per process and thread"""
+        return entry.with_name(f'{entry.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+
+    def _write(self, entry, content):
+        # written to a temporary file first because workers share the cache
+        temp_entry = self._temporary(entry)
+        temp_entry.write_bytes(content)
+        os.replace(temp_entry, entry)
+
+    def load(self, source, name):
+        """
+        Returns the parsed content of a YAML document
+        """
+        if not self.enabled:
+            with source.open(name) as file:
+                return YamlStream.load(file)
+        entry = self._entry('doc', source, name)
+        if entry.exists():
+            try:
+                data = pickle.loads(entry.read_bytes())
+                os.utime(entry)
+                return data
+            except (pickle.UnpicklingError, EOFError, OSError):
+                pass
+        with source.open(name) as file:
+            data = YamlStream.load(file)
+        self._write(entry, pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+        return data
+
+    def iterate_mapping(self, source, name):
+        """
+        Yields (key, value) tuples of a big YAML mapping, the cached version
+        is also read one entry at a time
+        """
+        return self._iterate(source, name, 'map', YamlStream.iterate_mapping)
+
+    def iterate_sequence(self, source, name):
+        """
+        Yields the items of a big YAML sequence
+        """
+        return self._iterate(source, name, 'seq', YamlStream.iterate_sequence)
+
+    def _iterate(self, source, name, kind, iterator):
+        if not self.enabled:
+            with source.open(name) as file:
+                yield from iterator(file)
+            return
+        entry = self._entry(kind, source, name)
+        if entry.exists():
+            os.utime(entry)
+            with entry.open('rb') as file:
+                unpickler = pickle.Unpickler(file)
+                while True:
+                    try:
+                        yield unpickler.load()
+                    except EOFError:
+                        return
+        temp_entry = self._temporary(entry)
+        try:
+            with source.open(name) as file, temp_entry.open('wb') as cache_file:
+                for item in iterator(file):
+                    pickle.dump(item, cache_file, pickle.HIGHEST_PROTOCOL)
+                    yield item
+            os.replace(temp_entry, entry)
+        finally:
+            if temp_entry.exists():
+                temp_entry.unlink()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits in its size cap
+        """
+        if not self.enabled:
+            return 0
+        entries = []
+        total = 0
+        for entry in self._directory.iterdir():
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry))
+                total += stat.st_size
+        removed = 0
+        for _, size, entry in sorted(entries, key=lambda item: item[0]):
+            if total <= self._max_size:
+                break
+            entry.unlink()
+            total -= size
+            removed += 1
+        return removed
@@ -0,0 +1,75 @@
+# -*- coding: UTF-8 -*-
+"""
+Axonometric projections used to flatten the 3D coordinates of the SDE
+based upon https://www.compuphase.com/axometr.htm formulas
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def isometric(x_coord, y_coord, z_coord, projected_axis):
+    """
+    calculate isometric projection coordinates over 3D points
+    Alternative Formula but not verified
+    https://gamedev.stackexchange.com/questions/159434/how-to-convert-3d-coordinates-to-2d-isometric-coordinates
+    """
+    n = [0.0,0.0,0.0]
+    if projected_axis == 2:
+        n[0] = x_coord - z_coord
+        n[1] = y_coord + ((x_coord + z_coord)/2)
+    if projected_axis == 1:
+        n[0] = x_coord - y_coord
+        n[2] = z_coord + ((x_coord + y_coord)/2)
+    if projected_axis == 0:
+        n[1] = y_coord - x_coord
+        n[2] = z_coord + ((y_coord + x_coord)/2)
+    return n
+
+
+def dimetric(x_coord, y_coord, z_coord, projected_axis):
+    """
+    calculate military oblique projection coordinates over 3D points
+    """
+    n = [0.0,0.0,0.0]
+    if projected_axis == 2:
+        n[0] = x_coord + (z_coord / 4)
+        n[1] = y_coord + (z_coord / 2)
+    if projected_axis == 1:
+        n[0] = x_coord + (y_coord / 4)
+        n[2] = z_coord + (y_coord / 2)
+    if projected_axis == 0:
+        n[1] = y_coord + (x_coord / 4)
+        n[2] = z_coord + (x_coord / 2)
+    return n
+
+
+def project(algorithm, x_coord, y_coord, z_coord, projected_axis):
+    """
+    Apply the configured projection algorithm ('isometric', 'dimetric' or 'none')
+    """
+    if algorithm == 'isometric':
+        return isometric(x_coord, y_coord, z_coord, projected_axis)
+    if algorithm == 'dimetric':
+        return dimetric(x_coord, y_coord, z_coord, projected_axis)
+    return [x_coord, y_coord, z_coord]
+
+
+def project_points(points, algorithm, projected_axis, matrix=None):
+    """
+    Project a sequence of (x, y, z) points in a single pass, with NumPy the same
+    formulas run over whole coordinate columns. A 3x3 matrix (rows are the
+    projected X, Y and Z) replaces the algorithm. Returns a list of [x, y, z]
+    """
+    if numpy is None:
+        if matrix is not None:
+            return [[row[0] * x + row[1] * y + row[2] * z for row in matrix]
+                    for x, y, z in points]
+        return [project(algorithm, x, y, z, projected_axis) for x, y, z in points]
+    points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 3)
+    if matrix is not None:
+        return (points @ numpy.asarray(matrix, dtype=numpy.float64).T).tolist()
+    columns = project(algorithm, points[:, 0], points[:, 1], points[:, 2], projected_axis)
+    return numpy.column_stack([numpy.broadcast_to(column, points.shape[:1])
+                               for column in columns]).tolist()
@@ -0,0 +1,61 @@
+# -*- coding: UTF-8 -*-
+"""
+Provides the projection of the coordinates already stored on the database,
+it permits to change the projection of an existing database without
+parsing the SDE again, e.g.
+
+    ProjectionEngine(sqlite3.connect('sde.db')).project_table(
+        'mapSolarSystems', 'dimetric', 2)
+"""
+import projection
+
+
+class ProjectionEngine():
+    """
+    Reads the coordinates of a whole table, projects them in one pass and
+    writes every row back with a single UPDATE ... FROM a temporary table
+    """
+    # coordinate columns of the tables that can be projected
+    tables = {'mapSolarSystems': ('centerX', 'centerY', 'centerZ'),
+              'mapPlanets': ('positionX', 'positionY', 'positionZ'),
+              'mapMoons': ('positionX', 'positionY', 'positionZ'),
+              'mapSystemGates': ('positionX', 'positionY', 'positionZ')}
+    projected_columns = ('projX', 'projY', 'projZ')
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def _add_projected_columns(self, cur, table):
+        """planets, moons and gates don't have the projected columns by default"""
+        columns = {row[1] for row in cur.execute(f'PRAGMA table_info({table});')}
+        for column in self.projected_columns:
+            if column not in columns:
+                cur.execute(f'ALTER TABLE {table} ADD COLUMN {column} FLOAT '
+                            'NOT NULL DEFAULT(0.0);')
+
+    def project_table(self, table, algorithm, projected_axis, matrix=None):
+        """
+        Projects the coordinates of a table with an algorithm ('isometric',
+        'dimetric' or 'none') or a 3x3 matrix, returns the rows updated
+        """
+        x_column, y_column, z_column = self.tables[table]
+        cur = self._connection.cursor()
+        self._add_projected_columns(cur, table)
+        rows = cur.execute(f'SELECT rowid, {x_column}, {y_column}, {z_column} '
+                           f'FROM {table};').fetchall()
+        if not rows:
+            cur.close()
+            return 0
+        row_ids = [row[0] for row in rows]
+        projected = projection.project_points([row[1:] for row in rows], algorithm,
+                                              projected_axis, matrix)
+        rows = None
+        cur.execute('CREATE TEMP TABLE projectedPoints (id INTEGER PRIMARY KEY, '
+                    'x FLOAT, y FLOAT, z FLOAT);')
+        cur.executemany('INSERT INTO temp.projectedPoints VALUES (?,?,?,?);',
+                        ((row_id,) + tuple(point) for row_id, point in zip(row_ids, projected)))
+        cur.execute(f'UPDATE {table} SET projX=p.x, projY=p.y, projZ=p.z '
+                    f'FROM temp.projectedPoints AS p WHERE {table}.rowid = p.id;')
+        cur.execute('DROP TABLE temp.projectedPoints;')
+        cur.close()
+        return len(row_ids)
@@ -0,0 +1,240 @@
+# -*- coding: UTF-8 -*-
+"""
+Provides the routing over the stargate network stored on mapSystemConnections,
+the graph is kept in memory as integer adjacency lists so a route doesn't
+need any SQL query. Optionally the jumps between every pair of known space
+systems are precomputed and stored on mapJumpTable
+"""
+import heapq
+from collections import deque
+
+
+class Router():
+    """
+    Shortest routes and jump counts between solar systems, the routes can
+    prefer (or avoid) high, low and null security space
+    """
+    HIGH_SEC = 'high'
+    LOW_SEC = 'low'
+    NULL_SEC = 'null'
+    # cost of a jump into a system of each security class
+    preferences = {'shortest': {HIGH_SEC: 1, LOW_SEC: 1, NULL_SEC: 1},
+                   'secure': {HIGH_SEC: 1, LOW_SEC: 1000, NULL_SEC: 1000},
+                   'insecure': {HIGH_SEC: 1000, LOW_SEC: 1, NULL_SEC: 1}}
+    # stored on the jump table for unreachable (or farther than 254 jumps) systems
+    UNREACHABLE = 255
+    # known space systems, the only ones included in the jump table
+    kspace_range = (30000000, 31000000)
+
+    @staticmethod
+    def security_class(security):
+        """
+        high, low or null security like the game does, the status is rounded to
+        one decimal but anything above 0.0 is at least low security
+        """
+        if security is None or security <= 0.0:
+            return Router.NULL_SEC
+        if round(security, 1) >= 0.5:
+            return Router.HIGH_SEC
+        return Router.LOW_SEC
+
+    def __init__(self, systems, connections):
+        """
+        systems are (solarSystemId, security) tuples and connections are
+        (systemA, systemB) pairs, every connection works both ways
+        """
+        self._ids = []
+        self._index = {}
+        self._classes = []
+        for system_id, security in sorted(systems):
+            self._index[system_id] = len(self._ids)
+            self._ids.append(system_id)
+            self._classes.append(self.security_class(security))
+        self._adjacency = [[] for _ in self._ids]
+        for system_a, system_b in connections:
+            index_a = self._index.get(system_a)
+            index_b = self._index.get(system_b)
+            if index_a is None or index_b is None or index_a == index_b:
+                continue
+            self._adjacency[index_a].append(index_b)
+            self._adjacency[index_b].append(index_a)
+        self._adjacency = [sorted(set(neighbors)) for neighbors in self._adjacency]
+        self._jump_index = {}
+        self._jump_rows = {}
+
+    @classmethod
+    def from_database(cls, connection):
+        """Loads the systems and their connections from a built database"""
+        cur = connection.cursor()
+        systems = cur.execute('SELECT solarSystemId, security FROM mapSolarSystems;').fetchall()
+        connections = cur.execute('SELECT systemA, systemB FROM mapSystemConnections;').fetchall()
+        cur.close()
+        return cls(systems, connections)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, system_id):
+        return system_id in self._index
+
+    def neighbors(self, system_id):
+        """IDs of the systems connected by a stargate"""
+        return [self._ids[index] for index in self._adjacency[self._index[system_id]]]
+
+    def security(self, system_id):
+        """security class of a system"""
+        return self._classes[self._index[system_id]]
+
+    def _bfs(self, origin, destination=None, avoid=frozenset()):
+        """jumps from origin to every reachable system (or until destination)"""
+        distances = {origin: 0}
+        parents = {origin: None}
+        queue = deque((origin,))
+        while queue:
+            current = queue.popleft()
+            if current == destination:
+                break
+            for neighbor in self._adjacency[current]:
+                if neighbor not in distances and neighbor not in avoid:
+                    distances[neighbor] = distances[current] + 1
+                    parents[neighbor] = current
+                    queue.append(neighbor)
+        return distances, parents
+
+    def _dijkstra(self, origin, destination, weights, avoid=frozenset()):
+        costs = {origin: 0}
+        parents = {origin: None}
+        heap = [(0, origin)]
+        while heap:
+            cost, current = heapq.heappop(heap)
+            if current == destination:
+                break
+            if cost > costs[current]:
+                continue
+            for neighbor in self._adjacency[current]:
+                if neighbor in avoid:
+                    continue
+                new_cost = cost + weights[self._classes[neighbor]]
+                if new_cost < costs.get(neighbor, new_cost + 1):
+                    costs[neighbor] = new_cost
+                    parents[neighbor] = current
+                    heapq.heappush(heap, (new_cost, neighbor))
+        return parents
+
+    def _indexes(self, system_ids):
+        return frozenset(self._index[system_id] for system_id in system_ids
+                         if system_id in self._index)
+
+    def route(self, origin, destination, preference='shortest', avoid=()):
+        """
+        Returns the list of systems (origin and destination included) of the
+        best route for the preference ('shortest', 'secure', 'insecure' or a
+        dict with the cost per security class), None if there isn't a route
+        """
+        start, end = self._index[origin], self._index[destination]
+        avoided = self._indexes(avoid) - {start, end}
+        weights = self.preferences.get(preference, preference)
+        if isinstance(weights, str):
+            raise ValueError(f'Unknown route preference: {preference}')
+        if len(set(weights.values())) == 1:
+            _, parents = self._bfs(start, end, avoided)
+        else:
+            parents = self._dijkstra(start, end, weights, avoided)
+        if end not in parents:
+            return None
+        path = []
+        current = end
+        while current is not None:
+            path.append(self._ids[current])
+            current = parents[current]
+        return path[::-1]
+
+    def jumps(self, origin, destination):
+        """Number of jumps of the shortest route, None if there isn't a route"""
+        row = self._jump_rows.get(origin)
+        if row is not None and destination in self._jump_index:
+            jumps = row[self._jump_index[destination]]
+            if jumps != self.UNREACHABLE:
+                return jumps
+        distances, _ = self._bfs(self._index[origin], self._index[destination])
+        return distances.get(self._index[destination])
+
+    def within_jumps(self, origin, max_jumps):
+        """dict of the systems reachable in max_jumps or less with their jumps"""
+        start = self._index[origin]
+        distances = {start: 0}
+        queue = deque((start,))
+        while queue:
+            current = queue.popleft()
+            if distances[current] == max_jumps:
+                continue
+            for neighbor in self._adjacency[current]:
+                if neighbor not in distances:
+                    distances[neighbor] = distances[current] + 1
+                    queue.append(neighbor)
+        return {self._ids[index]: jumps for index, jumps in distances.items()}
+
+    def jump_table(self):
+        """
+        Yields (solarSystemId, jumps) for every known space system, jumps is
+        a bytes object with one byte per system in ascending ID order
+        """
+        start, end = self.kspace_range
+        members = [index for index, system_id in enumerate(self._ids)
+                   if start <= system_id < end]
+        position = [-1] * len(self._ids)
+        for column, index in enumerate(members):
+            position[index] = column
+        adjacency = self._adjacency
+        for index in members:
+            row = bytearray([self.UNREACHABLE]) * len(members)
+            row[position[index]] = 0
+            seen = bytearray(len(self._ids))
+            seen[index] = 1
+            frontier = [index]
+            jumps = 0
+            while frontier and jumps < self.UNREACHABLE - 1:
+                jumps += 1
+                following = []
+                for current in frontier:
+                    for neighbor in adjacency[current]:
+                        if not seen[neighbor]:
+                            seen[neighbor] = 1
+                            following.append(neighbor)
+                            if position[neighbor] >= 0:
+                                row[position[neighbor]] = jumps
+                frontier = following
+            yield self._ids[index], bytes(row)
+
+    def save_jump_table(self, connection):
+        """
+        Stores the jump table on mapJumpTable, the table is created again on
+        every call. Returns the number of systems stored
+        """
+        cur = connection.cursor()
+        cur.execute('DROP TABLE IF EXISTS mapJumpTable;')
+        cur.execute('CREATE TABLE mapJumpTable (solarSystemId INTEGER PRIMARY KEY '
+                    'REFERENCES mapSolarSystems(solarSystemId), jumps BLOB NOT NULL);')
+        cur.executemany('INSERT INTO mapJumpTable (solarSystemId, jumps) VALUES (?,?);',
+                        self.jump_table())
+        total = cur.execute('SELECT COUNT(*) FROM mapJumpTable;').fetchone()[0]
+        cur.close()
+        return total
+
+    def load_jump_table(self, connection):
+        """
+        Loads mapJumpTable so jumps() between known space systems is a lookup,
+        returns False if the database doesn't have the table
+        """
+        cur = connection.cursor()
+        exists = cur.execute("SELECT name FROM sqlite_master WHERE type='table' "
+                             "AND name='mapJumpTable';").fetchone()
+        if exists is None:
+            cur.close()
+            return False
+        rows = cur.execute('SELECT solarSystemId, jumps FROM mapJumpTable '
+                           'ORDER BY solarSystemId;').fetchall()
+        cur.close()
+        self._jump_index = {system_id: column for column, (system_id, _) in enumerate(rows)}
+        self._jump_rows = dict(rows)
+        return True
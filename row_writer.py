@@ -0,0 +1,105 @@
+# -*- coding: UTF-8 -*-
+"""
+Provides a buffered writer that groups the inserted rows by table
+and sends them to the database in batches
+"""
+import sys
+
+
+class RowWriter():
+    """
+    Collects tuples in one buffer per table and flushes them through executemany
+    when a buffer reaches the batch size or all buffers reach the memory limit
+    """
+    _connection = None
+    _batch_size = 5000
+    _memory_limit = 32 * 1024**2
+
+    @property
+    def batch_size(self):
+        """the number of rows kept per table before flushing it"""
+        return self._batch_size
+
+    @batch_size.setter
+    def batch_size(self, value):
+        if isinstance(value, int) and value > 0:
+            self._batch_size = value
+
+    @property
+    def memory_limit(self):
+        """approximated size in bytes of all the buffers before flushing them"""
+        return self._memory_limit
+
+    @memory_limit.setter
+    def memory_limit(self, value):
+        if isinstance(value, int) and value > 0:
+            self._memory_limit = value
+
+    @property
+    def rows_written(self):
+        """dict with the number of rows sent to every table"""
+        return dict(self._rows_written)
+
+    def __init__(self, connection, batch_size=5000, memory_limit=32 * 1024**2):
+        self._connection = connection
+        self.batch_size = batch_size
+        self.memory_limit = memory_limit
+        self._queries = {}
+        self._buffers = {}
+        self._row_sizes = {}
+        self._rows_written = {}
+        self._buffered_bytes = 0
+
+    def register(self, table, query):
+        """
+        Register the INSERT statement (with ? placeholders) used for a table
+        """
+        if table in self._buffers:
+            self.flush(table)
+        self._queries[table] = query
+        self._buffers.setdefault(table, [])
+        self._rows_written.setdefault(table, 0)
+
+    def is_registered(self, table):
+        """True if the table already has a statement"""
+        return table in self._queries
+
+    def add(self, table, row):
+        """
+        Add a tuple to the table buffer, the buffers are flushed when needed
+        """
+        buffer = self._buffers[table]
+        buffer.append(row)
+        row_size = self._row_sizes.get(table)
+        if row_size is None:
+            # the size of the first row is used as estimation for the rest
+            row_size = sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+            self._row_sizes[table] = row_size
+        self._buffered_bytes += row_size
+        if len(buffer) >= self._batch_size:
+            self.flush(table)
+        elif self._buffered_bytes >= self._memory_limit:
+            self.flush()
+
+    def add_many(self, table, rows):
+        """Add several tuples to the table buffer"""
+        for row in rows:
+            self.add(table, row)
+
+    def flush(self, table=None):
+        """
+        Write the buffered rows of a table, or of every table if none is given
+        """
+        tables = list(self._buffers) if table is None else [table]
+        cur = self._connection.cursor()
+        for name in tables:
+            buffer = self._buffers[name]
+            if len(buffer) == 0:
+                continue
+            cur.executemany(self._queries[name], buffer)
+            self._rows_written[name] += len(buffer)
+            self._buffered_bytes -= len(buffer) * self._row_sizes[name]
+            buffer.clear()
+        cur.close()
+        if table is None:
+            self._buffered_bytes = 0
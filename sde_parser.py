@@ -1,10 +1,22 @@
 #!/usr/bin/env python3
 # -*- coding: UTF-8 -*-
 """ This script provides a Class to parse SDE structure into a SQLite Database"""
-from pathlib import Path
-import yaml
+import os
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from database_driver import DatabaseDriver, DatabaseType
-from data_object import GenericEntity
+from data_object import GenericEntity, NameIndex
+from instrumentation import Instrumentation
+from parse_cache import ParseCache
+from sde_source import SdeSource, SourceNotFoundError
+from row_writer import RowWriter
+from system_reader import SystemReader, init_worker, read_in_worker, worker_context
+import projection
+from projection_engine import ProjectionEngine
+from routing import Router
+from spatial_index import SpatialIndex
+from snapshot_export import SnapshotExporter
 
 
 class SdeConfig:
@@ -18,8 +30,47 @@ class SdeConfig:
     map_void = False
     projection_algorithm = 'isometric' # posibles values are 'isometric' and 'dimetric'
     projected_axis = 1 # 0 for X axis , 1 for Y and 2 for Z
+    projection_matrix = None # 3x3 matrix used instead of projection_algorithm
+    project_celestials = False # also project planets, moons and gates
     with_moons = True
     with_gates = True
+    with_spatial_index = True # R*Tree tables of the systems, planets, moons and gates coordinates
+    with_jump_table = False # precompute the jumps between known space systems on mapJumpTable
+    selective_types = False # only the types used by the map tables, with their groups and categories
+    extra_type_groups = () # groups whose types are always imported by selective_types
+    extra_type_categories = () # categories whose types are always imported by selective_types
+    parse_workers = 1 # processes used to parse solar systems, 0 uses every core
+    write_batch_size = 5000 # rows buffered per table before writing them
+    write_buffer_memory = 32 * 1024**2 # bytes buffered on all tables before writing them
+    bulk_load = True # unsafe/fast database settings and deferred indexes while building
+    bulk_cache_size = 262144 # page cache in KiB used during the bulk load
+    cache_directory = None # directory to cache the parsed YAML files, None disables it
+    cache_max_size = 1024**3 # bytes kept in the parse cache
+    snapshot_directory = None # columnar .npy export of the map tables, None disables it
+    build_location = None # ':memory:' or a directory (e.g. a tmpfs) where the database is built
+    page_size = None # page size in bytes of a new database, None keeps the SQLite default
+    journal_mode = 'WAL' # journal of the finished database, WAL permits concurrent readers
+    schema_version = 2 # changes of the tables force a full build
+
+    def settings(self):
+        """
+        Options that change the content of the database, an incremental
+        build is only possible when they didn't change. The projection isn't
+        included because it is calculated again on every build
+        """
+        return {'schema': self.schema_version,
+                'extended_coordinates': self.extended_coordinates,
+                'map_kspace': self.map_kspace,
+                'map_wspace': self.map_wspace,
+                'map_abbysal': self.map_abbysal,
+                'map_void': self.map_void,
+                'with_moons': self.with_moons,
+                'with_gates': self.with_gates,
+                'with_jump_table': self.with_jump_table,
+                'with_spatial_index': self.with_spatial_index,
+                'selective_types': self.selective_types,
+                'extra_type_groups': sorted(self.extra_type_groups),
+                'extra_type_categories': sorted(self.extra_type_categories)}
 
 
 class DataBrigde():
@@ -69,17 +120,45 @@ class SdeParser:
     _db_driver = None
     _db_type = None
     _config = SdeConfig()
-    # this counter permits to detect what item we are iterating now
-    _counter = -1
-    # this representes the current location (Region,Constellation,System)
-    _Location = [{"name": None, "id": None}, {"name": None, "id": None}, {"name": None, "id": None}]
     _stars = GenericEntity()
+    _writer = None
+    _names = None
+    _cache = ParseCache()
+    # tables updated in place by incremental builds
+    _upsert_tables = ('invCategories', 'invGroups', 'invTypes', 'mapRegions',
+                      'mapConstellations', 'mapSolarSystems')
+    # universe directories and the setting that enables them
+    _universes = {'eve': 'map_kspace', 'wormhole': 'map_wspace',
+                  'abyssal': 'map_abbysal', 'void': 'map_void'}
+
+    @property
+    def entity_files(self):
+        """
+        Universe files parsed in this run (relative to the SDE directory) with
+        the ID of the region, constellation or system that they contain
+        """
+        return self._entity_files
 
     @property
     def configuration(self):
         """Object that stores the parsing configuration"""
         return self._config
 
+    @property
+    def source(self):
+        """the SdeSource used to read the SDE files"""
+        return self._source
+
+    @property
+    def instrumentation(self):
+        """the Instrumentation that records the metrics of every stage"""
+        return self._instrumentation
+
+    @instrumentation.setter
+    def instrumentation(self, value):
+        if isinstance(value, Instrumentation):
+            self._instrumentation = value
+
     @property
     def yaml_directory(self):
         """the database file name"""
@@ -91,64 +170,103 @@ class SdeParser:
 
     # Constructor
     def __init__(self, directory, database_file, db_type=DatabaseType.SQLITE):
-        if Path(directory).is_dir():
-            self.yaml_directory = directory
-        else:
-            raise DirectoryNotFoundError('The specified directory does not exists.')
+        # the SDE can be an extracted directory or the sde.zip archive
+        try:
+            self._source = SdeSource.create(directory)
+        except SourceNotFoundError as error:
+            raise DirectoryNotFoundError('The specified directory does not exists.') from error
+        self.yaml_directory = directory
         if db_type == DatabaseType.SQLITE:
             print("SDE: Using SQLite as Database Engine...")
         self._db_driver = DatabaseDriver(db_type, database_file)
         self._db_type = db_type
         self._config = SdeConfig()
+        self._entity_files = {}
+        self._gates = {}
+        self._inventory = None
+        self._pending_stars = None
+        self._instrumentation = Instrumentation()
 
     def calculate_isometric_projection(self, x_coord, y_coord, z_coord, projected_axis):
         """
         calculate isometric projection coordinates over 3D points
         based upon https://www.compuphase.com/axometr.htm formulas
-        Alternative Formula but not verified 
-        https://gamedev.stackexchange.com/questions/159434/how-to-convert-3d-coordinates-to-2d-isometric-coordinates
-        """
-        n = [0.0,0.0,0.0]
-        if projected_axis == 2:
-            n[0] = x_coord - z_coord
-            n[1] = y_coord + ((x_coord + z_coord)/2)
-        if projected_axis == 1:
-            n[0] = x_coord - y_coord
-            n[2] = z_coord + ((x_coord + y_coord)/2)
-        if projected_axis == 0:
-            n[1] = y_coord - x_coord
-            n[2] = z_coord + ((y_coord + x_coord)/2)
-        return (n)
+        """
+        return projection.isometric(x_coord, y_coord, z_coord, projected_axis)
 
     def calculate_dimetric_projection(self, x_coord, y_coord, z_coord, projected_axis):
         """
         calculate military oblique projection coordinates over 3D points
         based upon https://www.compuphase.com/axometr.htm formulas 
         """
-        n = [0.0,0.0,0.0]
-        if projected_axis == 2:
-            n[0] = x_coord + (z_coord / 4)
-            n[1] = y_coord + (z_coord / 2)
-        if projected_axis == 1:
-            n[0] = x_coord + (y_coord / 4)
-            n[2] = z_coord + (y_coord / 2)
-        if projected_axis == 0:
-            n[1] = y_coord + (x_coord / 4)
-            n[2] = z_coord + (x_coord / 2)  
-        return (n)
-
-    def _read_directory(self, directory_path):
-        for element in directory_path.iterdir():
-            if element.is_dir():
-                self._counter += 1
-                if self._counter == 0:
-                    self._parse_region(element.joinpath('region.staticdata'))
-                if self._counter == 1:
-                    self._parse_constellation(element.joinpath('constellation.staticdata'))
-                self._read_directory(element)
-                self._counter -= 1
-            if element.is_file() and element.name == "solarsystem.staticdata":
-                self._parse_solar_system(element)
+        return projection.dimetric(x_coord, y_coord, z_coord, projected_axis)
+
+    @contextmanager
+    def _stage(self, name, *files):
+        """
+        Runs the with block as an instrumented stage that reads the given files,
+        the buffered rows are written before the stage ends
+        """
+        with self._instrumentation.stage(name, self._db_driver.connection) as metrics:
+            for file_name in files:
+                metrics.add_bytes(self._source.size(file_name))
+            yield metrics
+            if self._writer is not None:
+                self._writer.flush()
+
+    def _read_directory(self, directory_name, metrics=None):
+        """
+        Walks a universe directory (Region > Constellation > System), regions and
+        constellations are written as they are found and every solar system is
+        yielded as a work item that carries its location
+        """
+        for region_dir in self._source.list_directories(directory_name):
+            region_file = region_dir + '/region.staticdata'
+            region = self._parse_region(region_file)
+            files = [region_file]
+            for constellation_dir in self._source.list_directories(region_dir):
+                constellation_file = constellation_dir + '/constellation.staticdata'
+                constellation = self._parse_constellation(constellation_file, region)
+                files.append(constellation_file)
+                for system_dir in self._source.list_directories(constellation_dir):
+                    system_file = system_dir + '/solarsystem.staticdata'
+                    if self._source.exists(system_file):
+                        files.append(system_file)
+                        yield (system_file, region, constellation)
+            if metrics is not None:
+                metrics.add_bytes(sum(self._source.size(name) for name in files))
+
+    def _parse_universes(self):
+        """Parse every universe enabled in the configuration"""
+        descriptions = {'eve': 'High,Low and Nullsec', 'wormhole': 'Wormhole',
+                        'abyssal': 'Abyssal', 'void': 'Void'}
+        for directory, setting in self._universes.items():
+            if getattr(self._config, setting):
+                print(f'SDE: parsing {descriptions[directory]} Systems')
+                self._parse_universe('fsd/universe/' + directory)
+
+    def _parse_universe(self, directory_name):
+        """
+        Parse every solar system of a universe directory, when parse_workers is
+        different than 1 the YAML parsing is done by a pool of processes while
+        this process remains as the only database writer
+        """
+        with self._stage('universe ' + posixpath.basename(directory_name)) as metrics:
+            self._parse_systems(directory_name, metrics)
+
+    def _parse_systems(self, directory_name, metrics):
+        reader = SystemReader(self._config, self._source, self._cache)
+        work_items = self._read_directory(directory_name, metrics)
+        if self._config.parse_workers == 1:
+            for item in work_items:
+                self._parse_solar_system(reader.read(item))
+            return
+        workers = self._config.parse_workers or os.cpu_count()
+        # the reader (and the index of sde.zip) is pickled once per worker, not per chunk
+        with ProcessPoolExecutor(max_workers=workers, mp_context=worker_context(),
+                                 initializer=init_worker, initargs=(reader,)) as executor:
+            for data in executor.map(read_in_worker, work_items, chunksize=16):
+                self._parse_solar_system(data)
 
     # Not used for now
     def spinner(self, value, lenght=3, width=7, message=None):
@@ -172,11 +290,10 @@ class SdeParser:
         This method create the database Structure to populate the data from SDE and external sources
         """
         if self._db_type == DatabaseType.SQLITE:
+            self._relocate()
+            if self._config.bulk_load:
+                self._db_driver.begin_bulk_load(self._config.bulk_cache_size)
             cur = self._db_driver.connection.cursor()
-            query = ('CREATE TABLE invNames (itemId INT NOT NULL PRIMARY KEY '
-                     ',itemName TEXT NOT NULL);')
-            cur.execute(query)
-
             # categories - SQLite
             query = ('CREATE TABLE invCategories (categoryId INT NOT NULL PRIMARY KEY'
                      ',categoryName TEXT NOT NULL ,published BOOL NOT NULL);')
@@ -281,7 +398,7 @@ class SdeParser:
 
             # faction/solarSystem Index
             query = 'CREATE UNIQUE INDEX factionId ON factionSolarSystem (factionId);'
-            cur.execute(query)
+            self._db_driver.create_index(query)
 
             # Gates - SQLite (typeId here)
             query = ('CREATE TABLE mapSystemGates (systemGateId INT NOT NULL '
@@ -296,13 +413,25 @@ class SdeParser:
             cur.execute(query)
 
             # Implementing simplified SystemGates
-            query = ('CREATE TABLE mapSystemConnections (systemConnectionId CHAR(8) PRIMARY KEY,'
+            query = ('CREATE TABLE mapSystemConnections (systemConnectionId INTEGER PRIMARY KEY,'
                      'systemA INTEGER NOT NULL REFERENCES mapSolarSystems' 
                      '(solarSystemId) ON UPDATE CASCADE ON DELETE SET NULL,'
                      'systemB INTEGER NOT NULL REFERENCES mapSolarSystems'
                      '(solarSystemId) ON UPDATE CASCADE ON DELETE SET NULL);')
             cur.execute(query)
 
+            query = ('CREATE UNIQUE INDEX systemConnection ON mapSystemConnections'
+                     '(systemA, systemB);')
+            self._db_driver.create_index(query)
+
+            # both directions of every connection, the neighbors of a system
+            query = ('CREATE TABLE mapSystemNeighbors (solarSystemId INTEGER NOT NULL '
+                     'REFERENCES mapSolarSystems(solarSystemId) ON UPDATE CASCADE '
+                     'ON DELETE CASCADE, neighborId INTEGER NOT NULL REFERENCES '
+                     'mapSolarSystems(solarSystemId) ON UPDATE CASCADE ON DELETE CASCADE, '
+                     'PRIMARY KEY (solarSystemId, neighborId)) WITHOUT ROWID;')
+            cur.execute(query)
+
             # Planets - SQLite (typeId here)
             query = ('CREATE TABLE mapPlanets (planetId INT NOT NULL '
                      'PRIMARY KEY,solarSystemId INTEGER REFERENCES '
@@ -318,7 +447,7 @@ class SdeParser:
 
             query = ('CREATE UNIQUE INDEX planetSystem ON mapPlanets'
                      '(solarSystemId, planetaryIndex);')
-            cur.execute(query)
+            self._db_driver.create_index(query)
 
             # type - Star - SQLite
             query = ('CREATE TABLE typeStar ('
@@ -342,7 +471,7 @@ class SdeParser:
             # star index
             query = ('CREATE UNIQUE INDEX starId ON mapStars '
                      '(solarSystemId, starId);')
-            cur.execute(query)
+            self._db_driver.create_index(query)
 
             # Moons - SQLite
             query = ('CREATE TABLE mapMoons (moonId INT NOT NULL '
@@ -380,41 +509,313 @@ class SdeParser:
 
             # star index
             query = 'CREATE UNIQUE INDEX moonId ON mapMoons(moonId);'
-            cur.execute(query)
+            self._db_driver.create_index(query)
 
-            cur.connection.commit()
+            self._db_driver.commit()
             cur.close()
             print("SDE: Tables created from scratch...")
 
+    def _table_columns(self):
+        """
+        Columns of every table written by the parser, in the order used by the rows
+        """
+        coordinates = ()
+        if self._config.extended_coordinates:
+            coordinates = ('maxX', 'maxY', 'maxZ', 'minX', 'minY', 'minZ')
+        return {
+            'invCategories': ('categoryId', 'categoryName', 'published'),
+            'invGroups': ('groupId', 'categoryId', 'groupName', 'anchorable'),
+            'invTypes': ('typeId', 'groupId', 'typeName', 'iconId', 'published', 'volume'),
+            'mapRegions': ('regionId', 'regionName', 'factionId', 'centerX', 'centerY',
+                           'centerZ', 'nebula', 'wormholeClassId') + coordinates,
+            'mapConstellations': ('constellationId', 'constellationName', 'regionId',
+                                  'radius', 'centerX', 'centerY', 'centerZ') + coordinates,
+            'mapSolarSystems': ('solarSystemId', 'solarSystemName', 'constellationId',
+                                'corridor', 'fringe', 'hub', 'international', 'luminosity',
+                                'radius', 'centerX', 'centerY', 'centerZ', 'regional',
+                                'security', 'securityClass') + coordinates,
+            'mapSystemGates': ('systemGateId', 'solarSystemId', 'typeId', 'positionX',
+                               'positionY', 'positionZ', 'destination'),
+            'mapPlanets': ('planetId', 'solarSystemId', 'planetaryIndex', 'fragmented',
+                           'radius', 'locked', 'typeId', 'positionX', 'positionY',
+                           'positionZ'),
+            'mapMoons': ('moonId', 'solarSystemId', 'moonIndex', 'planetId', 'typeId',
+                         'radius', 'positionX', 'positionY', 'positionZ'),
+            'mapStars': ('starId', 'solarSystemId', 'locked', 'radius', 'starTypeId'),
+        }
+
+    def _register_statements(self, upsert=False):
+        """
+        Create the buffered writer and register the INSERT statement of every table,
+        with upsert the tables keyed by their first column update the existing rows
+        """
+        self._writer = RowWriter(self._db_driver.connection,
+                                 self._config.write_batch_size,
+                                 self._config.write_buffer_memory)
+        for table, columns in self._table_columns().items():
+            query = (f'INSERT INTO {table} ({", ".join(columns)}) '
+                     f'VALUES ({",".join("?" * len(columns))})')
+            if upsert and table in self._upsert_tables:
+                query += (f' ON CONFLICT({columns[0]}) DO UPDATE SET '
+                          + ', '.join(f'{column}=excluded.{column}' for column in columns[1:]))
+            self._writer.register(table, query)
+
+    def _relocate(self):
+        """moves the database to build_location, it is published on close"""
+        if self._config.build_location is not None:
+            self._db_driver.relocate(self._config.build_location, self._config.page_size)
+        elif self._config.page_size is not None:
+            # only applies while the database is still empty
+            self._db_driver.connection.execute(f'PRAGMA page_size={int(self._config.page_size)};')
+
+    def _open_cache(self):
+        self._cache = ParseCache(self._config.cache_directory, self._config.cache_max_size)
+
     def parse_data(self):
         """
         This method provides centralized point to parse all data
         and put it into tables
         """
-        self._parse_names()
-        self._parse_categories(Path(self._yaml_directory).joinpath('fsd', 'categoryIDs.yaml'))
-        self._parse_groups(Path(self._yaml_directory).joinpath('fsd', 'groupIDs.yaml'))
-        self._parse_types(Path(self._yaml_directory).joinpath('fsd', 'typeIDs.yaml'))
-        universe_dir = Path(self._yaml_directory).joinpath('fsd', 'universe')
-        if self._config.map_kspace:
-            print('SDE: parsing High,Low and Nullsec Systems')
-            self._read_directory(universe_dir.joinpath('eve'))
-        if self._config.map_wspace:
-            print('SDE: parsing Wormhole Systems')
-            self._read_directory(universe_dir.joinpath('wormhole'))
-        if self._config.map_abbysal:
-            print('SDE: parsing Abyssal Systems')
-            self._read_directory(universe_dir.joinpath('abyssal'))
-        if self._config.map_void:
-            print('SDE: parsing Void Systems')
-            self._read_directory(universe_dir.joinpath('void'))
-        self.parse_connections()
+        self._open_cache()
+        self._register_statements()
+        if self._config.selective_types:
+            self._start_selection()
+        with self._stage('names', 'bsd/invNames.yaml'):
+            self._parse_names()
+        with self._stage('categories', 'fsd/categoryIDs.yaml'):
+            self._parse_categories('fsd/categoryIDs.yaml')
+        with self._stage('groups', 'fsd/groupIDs.yaml'):
+            self._parse_groups('fsd/groupIDs.yaml')
+        if self._inventory is None:
+            # with selective_types the types are streamed once the map is known
+            with self._stage('types', 'fsd/typeIDs.yaml'):
+                self._parse_types('fsd/typeIDs.yaml')
+        self._parse_universes()
+        if self._inventory is not None:
+            with self._stage('selected types', 'fsd/typeIDs.yaml'):
+                self.write_selected_types()
+        with self._stage('connections'):
+            self.parse_connections()
+        if self._config.with_jump_table:
+            with self._stage('jump table'):
+                self.build_jump_table()
+        with self._stage('projection'):
+            self.project_coordinates()
+        if self._config.with_spatial_index:
+            with self._stage('spatial index'):
+                self.build_spatial_index()
+        if self._config.snapshot_directory is not None:
+            with self._stage('snapshot') as metrics:
+                metrics.add_rows(self.export_snapshot())
+
+    def update_data(self, changes, entities):
+        """
+        Applies the differences between two SDE releases (a ManifestDiff) to an
+        existing database, only the changed files are parsed again. entities
+        maps the universe files of the previous build with their entity ID
+        """
+        self._relocate()
+        # the bulk load settings aren't durable, sde.db is only updated in place with them off
+        if self._config.bulk_load and self._db_driver.build_location is not None:
+            self._db_driver.begin_bulk_load(self._config.bulk_cache_size)
+        self._open_cache()
+        self._register_statements(upsert=True)
+        self._load_star_types()
+        modified = set(changes.modified)
+        selective = self._reselect_types(changes)
+        if selective:
+            self._start_selection()
+        with self._stage('names', 'bsd/invNames.yaml'):
+            self._parse_names()
+            if 'bsd/invNames.yaml' in modified:
+                self._update_names()
+        self._update_inventory(modified, selective)
+        with self._stage('universe changes') as metrics:
+            universe_changed = self._update_universe(changes, entities, metrics)
+        if selective:
+            with self._stage('selected types', 'fsd/typeIDs.yaml'):
+                self._update_selected_types()
+        self._update_map_tables(universe_changed)
+        if self._config.snapshot_directory is not None:
+            with self._stage('snapshot') as metrics:
+                metrics.add_rows(self.export_snapshot())
+
+    def _reselect_types(self, changes):
+        """
+        True when selective_types has to select the types again, the selection
+        depends on the map so every change of the map or the inventory counts
+        """
+        if not self._config.selective_types:
+            return False
+        inventory_files = {'fsd/categoryIDs.yaml', 'fsd/groupIDs.yaml', 'fsd/typeIDs.yaml'}
+        return bool(inventory_files.intersection(changes.modified)) or any(
+            self._is_mapped(name) for name in changes.modified + changes.removed)
+
+    def _update_inventory(self, modified, selective):
+        """
+        Parse again the changed categories, groups and types, the rows that
+        aren't in the files any more are deleted. With selective the types
+        are streamed later by write_selected_types
+        """
+        files = [('categories', 'fsd/categoryIDs.yaml', self._parse_categories,
+                  'invCategories', 'categoryId'),
+                 ('groups', 'fsd/groupIDs.yaml', self._parse_groups, 'invGroups', 'groupId')]
+        if not selective:
+            files.append(('types', 'fsd/typeIDs.yaml', self._parse_types, 'invTypes', 'typeId'))
+        for stage, name, parse, table, key in files:
+            if name not in modified and not selective:
+                continue
+            with self._stage(stage, name):
+                ids = parse(name)
+                if not selective:
+                    self._delete_missing(table, key, ids)
+
+    def _update_selected_types(self):
+        """Writes the selected types and deletes the ones that aren't used any more"""
+        selected = self.write_selected_types()
+        self._delete_missing('invCategories', 'categoryId', selected['invCategories'])
+        self._delete_missing('invGroups', 'groupId', selected['invGroups'])
+        self._delete_missing('invTypes', 'typeId', selected['invTypes'])
+
+    def _update_map_tables(self, universe_changed):
+        """
+        Builds again the tables calculated from the map: connections, jump
+        table and spatial index when the universe changed, and the projection
+        """
+        if universe_changed:
+            with self._stage('connections'):
+                self._load_gates()
+                self.parse_connections()
+        if self._config.with_jump_table and (universe_changed or not self._has_jump_table()):
+            with self._stage('jump table'):
+                self.build_jump_table()
+        with self._stage('projection'):
+            self.project_coordinates()
+        if self._config.with_spatial_index and \
+                (universe_changed or not SpatialIndex(self._db_driver.connection).exists(
+                    'mapSolarSystems')):
+            with self._stage('spatial index'):
+                self.build_spatial_index()
+
+    def _update_universe(self, changes, entities, metrics):
+        """
+        Deletes the removed universe files and parse the modified ones,
+        returns True if something changed
+        """
+        removed = [name for name in changes.removed if self._is_mapped(name)]
+        modified = [name for name in changes.modified if self._is_mapped(name)]
+        print(f'SDE: {len(modified)} universe files changed, {len(removed)} removed')
+        for name in removed:
+            self._delete_entity(name, entities.get(name))
+        # regions first, then constellations and systems at last
+        order = {'region.staticdata': 0, 'constellation.staticdata': 1,
+                 'solarsystem.staticdata': 2}
+        modified.sort(key=lambda name: order.get(name.split('/')[-1], 3))
+        reader = SystemReader(self._config, self._source, self._cache)
+        locations = {}
+        for name in modified:
+            file_name = posixpath.basename(name)
+            constellation_dir = posixpath.dirname(posixpath.dirname(name))
+            if file_name == 'region.staticdata':
+                self._parse_region(name)
+            elif file_name == 'constellation.staticdata':
+                region = self._read_location(constellation_dir + '/region.staticdata',
+                                             'regionID', locations)
+                self._parse_constellation(name, region)
+            elif file_name == 'solarsystem.staticdata':
+                region = self._read_location(posixpath.dirname(constellation_dir)
+                                             + '/region.staticdata', 'regionID', locations)
+                constellation = self._read_location(constellation_dir
+                                                    + '/constellation.staticdata',
+                                                    'constellationID', locations)
+                data = reader.read((name, region, constellation))
+                self._delete_celestials(data['system'][0])
+                self._parse_solar_system(data)
+            metrics.add_bytes(self._source.size(name))
+        return bool(removed or modified)
+
+    def _is_mapped(self, name):
+        """True if the file belongs to a universe enabled in the configuration"""
+        parts = name.split('/')
+        if len(parts) < 4 or parts[1] != 'universe':
+            return False
+        setting = self._universes.get(parts[2])
+        return setting is not None and getattr(self._config, setting)
+
+    def _read_location(self, name, key, cache):
+        """Returns the id and name stored on a region or constellation file"""
+        if name not in cache:
+            element = self._cache.load(self._source, name)
+            cache[name] = {'id': element[key], 'name': self._get_name(element[key])}
+        return cache[name]
+
+    def _load_star_types(self):
+        """Restore the star group and types written by a previous build"""
+        cur = self._db_driver.connection.cursor()
+        row = cur.execute('SELECT groupId FROM invGroups WHERE groupName = ?;',
+                          ('Sun',)).fetchone()
+        if row is not None:
+            self._stars.id = row[0]
+        for type_id, star_type_id in cur.execute('SELECT typeId, starTypeId FROM typeStar;'):
+            self._stars.entity_type[type_id] = star_type_id
+        cur.close()
+
+    def _update_names(self):
+        """Update the names of regions, constellations and systems"""
+        cur = self._db_driver.connection.cursor()
+        names = [(name, item_id) for item_id, name in self._names.items()]
+        cur.executemany('UPDATE mapRegions SET regionName=? WHERE regionId=?;', names)
+        cur.executemany('UPDATE mapConstellations SET constellationName=? '
+                        'WHERE constellationId=?;', names)
+        cur.executemany('UPDATE mapSolarSystems SET solarSystemName=? '
+                        'WHERE solarSystemId=?;', names)
+        cur.close()
+
+    def _delete_missing(self, table, key, ids):
+        """Delete the rows of a table whose key is not in the parsed ids"""
+        self._writer.flush(table)
+        cur = self._db_driver.connection.cursor()
+        cur.execute('CREATE TEMP TABLE parsedIds (id INTEGER PRIMARY KEY);')
+        cur.executemany('INSERT OR IGNORE INTO parsedIds (id) VALUES (?);',
+                        ((item_id,) for item_id in ids))
+        cur.execute(f'DELETE FROM {table} WHERE {key} NOT IN (SELECT id FROM parsedIds);')
+        cur.execute('DROP TABLE parsedIds;')
+        cur.close()
+
+    def _delete_celestials(self, solar_system_id):
+        """Delete gates, planets, moons and star of a system before parsing it again"""
+        cur = self._db_driver.connection.cursor()
+        for table in ('mapSystemGates', 'mapPlanets', 'mapMoons', 'mapStars'):
+            cur.execute(f'DELETE FROM {table} WHERE solarSystemId=?;', (solar_system_id,))
+        cur.close()
+
+    def _delete_entity(self, name, entity_id):
+        """Delete the region, constellation or system stored on a removed file"""
+        if entity_id is None:
+            return
+        cur = self._db_driver.connection.cursor()
+        file_name = name.split('/')[-1]
+        if file_name == 'region.staticdata':
+            cur.execute('DELETE FROM mapRegions WHERE regionId=?;', (entity_id,))
+        elif file_name == 'constellation.staticdata':
+            cur.execute('DELETE FROM mapConstellations WHERE constellationId=?;', (entity_id,))
+        elif file_name == 'solarsystem.staticdata':
+            self._delete_celestials(entity_id)
+            cur.execute('DELETE FROM mapSolarSystems WHERE solarSystemId=?;', (entity_id,))
+        cur.close()
 
     def add_star_type(self,type_id, name, color):
         """
         Method that insert star data into custom table
         """
         cur = self._db_driver.connection.cursor()
+        query = 'SELECT starTypeId FROM typeStar WHERE typeId=?'
+        row = cur.execute(query, [type_id]).fetchone()
+        if row is not None:
+            query = 'UPDATE typeStar SET name=?, color=? WHERE starTypeId=?'
+            cur.execute(query, [name, color, row[0]])
+            cur.close()
+            return row[0]
         query = 'INSERT INTO typeStar (typeId, name, color) VALUES (?,?,?)'
         params = [type_id,name,color]
         cur.execute(query,params)
@@ -422,380 +823,334 @@ class SdeParser:
         params=[type_id]
         results=cur.execute(query,params)
         row = results.fetchone()
+        cur.close()
         return row[0]
 
-    def _parse_types(self, path_object):
-        cur = self._db_driver.connection.cursor()
-        process = {}
-        query = ('INSERT INTO invTypes(typeId, groupId, typeName, iconId,'
-                 ' published, volume) VALUES (:id ,:groupId, :name, '
-                 ':iconId, :published, :volume)')
-        with path_object.open(encoding='UTF-8') as file:
-            yaml_types = yaml.safe_load(file)
-            total = len(yaml_types)
-            cont = 0
-            for object_type in yaml_types.items():
-                if process.get(object_type[1]["groupID"]) is not None:
-                    pass
-                else:
-                    params = {}
-                    params['id'] = object_type[0]
-                    params['name'] = object_type[1]['name']['en']
-                    params['groupId'] = object_type[1]["groupID"]
-                    params['iconId'] = None
-                    if 'iconID' in object_type[1]:
-                        params['iconId'] = object_type[1]["iconID"]
-                    params['published'] = object_type[1]["published"]
-                    params['volume'] = None
-                    if 'volume' in object_type[1]:
-                        params['volume'] = object_type[1]["volume"]
-                    cur.execute(query, params)
-                    if params['groupId'] == self._stars.id:
-                        parse_name = params['name'].split(' ')
-                        star_id = self.add_star_type(object_type[0],
-                                                     parse_name[1],
-                                                     parse_name[2][1:-1])
-                        self._stars.entity_type[object_type[0]]=star_id
-                    cont += 1
-                print(f'SDE: parsing {total} Types [{round((cont / total)*100,2)}%]  \r', end="")
-            print(f'SDE: {total} Types parsed           ')
-        cur.close()
+    def _start_selection(self):
+        """
+        With selective_types the categories and groups are kept in memory and
+        the stars wait for their types, typeIDs.yaml is streamed once the
+        universe says which types are used
+        """
+        self._inventory = {'invCategories': {}, 'invGroups': {}}
+        self._pending_stars = []
 
-    def _parse_groups(self, path_object):
-        cur = self._db_driver.connection.cursor()
-        with path_object.open(encoding='UTF-8') as file:
-            y_groups = yaml.safe_load(file)
-            total = len(y_groups)
-            cont = 0
-            for group in y_groups.items():
-                params = {}
-                query = ('INSERT INTO invGroups(groupId, categoryId, groupName, anchorable) '
-                         'VALUES (:id ,:catId, :name, :anchor)')
-                params['id'] = group[0]
-                params['catId'] = group[1]["categoryID"]
-                params['name'] = group[1]["name"]["en"]
-                params['anchor'] = group[1]["anchorable"]
-                cont += 1
-                cur.execute(query, params)
-
-                # Detecting Sun Type to parse data on stars
-                if params['name'] == 'Sun':
-                    self._stars.id=params['id']
-
-                print(f'SDE: parsing {total} groups [{round((cont / total)*100,2)}%]  \r', end="")
-            print(f'SDE: {total} Groups parsed            ')
-        cur.close()
+    def _add_inventory(self, table, row):
+        """
+        Writes a group or category, with selective_types it is kept in
+        memory until the types say which ones are used
+        """
+        if self._inventory is None:
+            self._writer.add(table, row)
+        else:
+            self._inventory[table][row[0]] = row
 
-    def _parse_categories(self, path_object):
+    def _referenced_types(self):
+        """typeIDs used by the map tables and by the star types"""
+        self._writer.flush()
         cur = self._db_driver.connection.cursor()
-        with path_object.open(encoding='UTF-8') as file:
-            y_categories = yaml.safe_load(file)
-            total = len(y_categories)
-            cont = 0
-            for category in y_categories.items():
-                params = {}
-                query = ('INSERT INTO invCategories(categoryId, categoryName,'
-                         ' published) VALUES (:id ,:name, :publish)')
-                params['id'] = category[0]
-                params['name'] = category[1]["name"]["en"]
-                params['publish'] = category[1]["published"]
-                cont += 1
-                print(f'SDE: parsing {total} categories [{round((cont / total)*100,2)}%]  \r',
-                      end="")
-                cur.execute(query, params)
-            print(f'SDE: {total} Categories parsed          ')
+        rows = cur.execute('SELECT typeId FROM mapSystemGates UNION SELECT typeId FROM mapPlanets '
+                           'UNION SELECT typeId FROM mapMoons UNION SELECT typeId FROM typeStar;')
+        type_ids = {row[0] for row in rows if row[0] is not None}
         cur.close()
+        return type_ids
 
-    def _parse_solar_system(self, path_object):
-        cur = self._db_driver.connection.cursor()
-        params = {}
-
-        # query creation
-        query = ('INSERT INTO mapSolarSystems (solarSystemId ,solarSystemName ,constellationId '
-                 ',corridor ,fringe ,hub ,international ,luminosity ,radius ,centerX '
-                 ',centerY ,centerZ ,regional ,security ,securityClass ')
+    def write_selected_types(self):
+        """
+        Streams typeIDs.yaml writing only the types referenced by the map
+        tables, the star types and the types of extra_type_groups and
+        extra_type_categories, then the groups and categories of those types
+        and the stars of the universe. Returns the ids written per table
+        """
+        groups = self._inventory['invGroups']
+        categories = self._inventory['invCategories']
+        referenced = self._referenced_types()
+        extra_categories = set(self._config.extra_type_categories)
+        # every type of these groups is written
+        whole_groups = set(self._config.extra_type_groups) | {self._stars.id} | {
+            group_id for group_id, row in groups.items() if row[1] in extra_categories}
+        type_ids = set()
+        group_ids = set(self._config.extra_type_groups)
+        total = 0
+        for row in self._iterate_types('fsd/typeIDs.yaml'):
+            total += 1
+            if row[0] in referenced or row[1] in whole_groups:
+                self._writer.add('invTypes', row)
+                type_ids.add(row[0])
+                group_ids.add(row[1])
+        group_ids &= groups.keys()
+        category_ids = ({groups[group_id][1] for group_id in group_ids}
+                        | extra_categories) & categories.keys()
+        self._writer.add_many('invGroups', [groups[group_id] for group_id in sorted(group_ids)])
+        self._writer.add_many('invCategories', [categories[category_id]
+                                                for category_id in sorted(category_ids)])
+        stars = self._pending_stars
+        self._inventory = None
+        self._pending_stars = None
+        for row in stars:
+            self._parse_star(row)
+        print(f"SDE: {len(type_ids)} of {total} Types, {len(group_ids)} Groups and "
+              f"{len(category_ids)} Categories used by the map")
+        return {'invTypes': type_ids, 'invGroups': group_ids, 'invCategories': category_ids}
+
+    def _iterate_types(self, name):
+        """
+        typeIDs.yaml is the biggest file in the SDE, so it is streamed one
+        type at a time instead of loading the whole document in memory.
+        Yields the invTypes rows, the star types are added to typeStar
+        """
+        cont = 0
+        for type_id, object_type in self._cache.iterate_mapping(self._source, name):
+            type_name = object_type['name']['en']
+            group_id = object_type["groupID"]
+            if group_id == self._stars.id:
+                parse_name = type_name.split(' ')
+                star_id = self.add_star_type(type_id,
+                                             parse_name[1],
+                                             parse_name[2][1:-1])
+                self._stars.entity_type[type_id]=star_id
+            yield (type_id, group_id, type_name, object_type.get("iconID"),
+                   object_type["published"], object_type.get("volume"))
+            cont += 1
+            if cont % 1000 == 0:
+                print(f'SDE: parsing Types [{cont}]  \r', end="")
+        print(f'SDE: {cont} Types parsed           ')
+
+    def _parse_types(self, name):
+        """Writes every type of typeIDs.yaml, returns their ids"""
+        type_ids = []
+        for row in self._iterate_types(name):
+            type_ids.append(row[0])
+            self._writer.add('invTypes', row)
+        return type_ids
+
+    def _parse_groups(self, name):
+        y_groups = self._cache.load(self._source, name)
+        for group_id, group in y_groups.items():
+            group_name = group["name"]["en"]
+            self._add_inventory('invGroups', (group_id, group["categoryID"], group_name,
+                                              group["anchorable"]))
+
+            # Detecting Sun Type to parse data on stars
+            if group_name == 'Sun':
+                self._stars.id=group_id
+        print(f'SDE: {len(y_groups)} Groups parsed            ')
+        return list(y_groups)
+
+    def _parse_categories(self, name):
+        y_categories = self._cache.load(self._source, name)
+        for category_id, category in y_categories.items():
+            self._add_inventory('invCategories', (category_id, category["name"]["en"],
+                                                  category["published"]))
+        print(f'SDE: {len(y_categories)} Categories parsed          ')
+        return list(y_categories)
+
+    def _parse_solar_system(self, data):
+        """
+        Write a solar system read by SystemReader with all its celestials
+        """
+        row = data['system']
+        name = self._get_name(row[0])
+        print(f'SDE: Parsing {data["region"]["name"]} > {data["constellation"]["name"]} > {name}')
+        self._writer.add('mapSolarSystems', (row[0], name) + row[2:])
+        self._entity_files[data['path']] = row[0]
+        self._parse_gates(data['gates'])
+        self._parse_planets(data['planets'])
+        self._parse_moons(data['moons'])
+        if data['star'] is not None:
+            self._parse_star(data['star'])
+
+    def _parse_constellation(self, name, region):
+        element = self._cache.load(self._source, name)
+
+        constellation = {'id': element['constellationID'],
+                         'name': self._get_name(element['constellationID'])}
+        print(f'SDE: Parsing {region["name"]} > {constellation["name"]} >')
+        row = (constellation['id'], constellation['name'], region['id'],
+               element["radius"]) + tuple(element["center"])
         if self._config.extended_coordinates:
-            query += ',maxX ,maxY ,maxZ ,minX ,minY ,minZ '
-        query += ',projX ,projY ,projZ '
-        query += (') VALUES ( :id, :name, :constellationId, :corridor, :fringe, :hub, '
-                  ':international, :luminosity, :radius, :centerX, :centerY, :centerZ, '
-                  ':regional, :security, :securityClass')
+            row += tuple(element["max"]) + tuple(element["min"])
+        self._writer.add('mapConstellations', row)
+        self._entity_files[name] = constellation['id']
+        return constellation
+
+    def _parse_region(self, name):
+        region = self._cache.load(self._source, name)
+        location = {'id': region['regionID'], 'name': self._get_name(region['regionID'])}
+
+        print(f'SDE: Parsing {location["name"]} > > ')
+        row = (location['id'], location['name'], region.get('factionID')) + \
+            tuple(region["center"]) + (region["nebula"], region.get('wormholeClassID'))
         if self._config.extended_coordinates:
-            query += ',:maxX ,:maxY ,:maxZ ,:minX ,:minY ,:minZ '
-        query += ',:projX ,:projY ,:projZ );'
-
-        with path_object.open(encoding='UTF-8') as file:
-            element = yaml.safe_load(file)
-
-            # set the solar system Id
-            self._Location[self._counter]['id'] = element['solarSystemID']
-            self._Location[self._counter]['name'] = self._get_name(element['solarSystemID'])
-            # print('SDE: parsing data for system ' + self._Location[self._counter]["name"])
-            print(f'SDE: Parsing {self._Location[0]["name"]} > {self._Location[1]["name"]} > {self._Location[2]["name"]}')
-            params['id'] = element['solarSystemID']
-            params['name'] = self._Location[self._counter]['name']
-            params['constellationId'] = self._Location[1]['id']
-            params['corridor'] = element['corridor']
-            params['fringe'] = element['fringe']
-            params['hub'] = element['hub']
-            params['international'] = element['international']
-            params['luminosity'] = element['luminosity']
-            params['radius'] = element['radius']
-            params['centerX'] = element['center'][0]
-            params['centerY'] = element['center'][1]
-            params['centerZ'] = element['center'][2]
-            if self._config.extended_coordinates:
-                params['minX'] = element['min'][0]
-                params['minY'] = element['min'][1]
-                params['minZ'] = element['min'][2]
-                params['maxX'] = element['max'][0]
-                params['maxY'] = element['max'][1]
-                params['maxZ'] = element['max'][2]
-            if self._config.projection_algorithm == 'isometric':
-                projection = self.calculate_isometric_projection(x_coord=element['center'][0],
-                                                                 y_coord=element['center'][1],
-                                                                 z_coord=element['center'][2],
-                                                                 projected_axis=self._config.projected_axis)
-                params['projX'] = projection[0]
-                params['projY'] = projection[1]
-                params['projZ'] = projection[2]
-            elif self._config.projection_algorithm == 'dimetric':
-                projection = self.calculate_dimetric_projection(x_coord=element['center'][0],
-                                                                y_coord=element['center'][1],
-                                                                z_coord=element['center'][2],
-                                                                projected_axis=self._config.projected_axis)
-                params['projX'] = projection[0]
-                params['projY'] = projection[1]
-                params['projZ'] = projection[2]
-            else:
-                params['projX'] = element['center'][0]
-                params['projY'] = element['center'][1]
-                params['projZ'] = element['center'][2]
-            params['regional'] = element['regional']
-            params['security'] = element['security']
-            params['securityClass'] = None
-            if 'securityClass' in element:
-                params['securityClass'] = element['securityClass']
-            cur.execute(query, params)
-
-            # avoiding parsing gates, stars and planets for systems that doesn't have it
-            if params['id'] < 32000000 or ( params['id'] >= 33000000  and params['id'] < 34000000) or params['id'] >= 35000000:
-                if self.configuration.with_gates:
-                    self._parse_gates(element['stargates'])
-                self._parse_planets(element['planets'])
-                self._parse_star(element['star'])
-        cur.close()
+            row += tuple(region["max"]) + tuple(region["min"])
+        self._writer.add('mapRegions', row)
+        self._entity_files[name] = location['id']
+        return location
 
-    def _parse_constellation(self, path_object):
-        cur = self._db_driver.connection.cursor()
-        # query creation
-        query = ('INSERT INTO mapConstellations (constellationId ,constellationName ,regionId '
-                 ' ,radius ,centerX ,centerY ,centerZ ')
-        if self._config.extended_coordinates:
-            query += ',maxX ,maxY ,maxZ ,minX ,minY ,minZ'
-        query += ') VALUES (:id ,:name ,:regionId ,:radius ,:centerX ,:centerY ,:centerZ '
-        if self._config.extended_coordinates:
-            query += ',:maxX ,:maxY ,:maxZ ,:minX ,:minY ,:minZ'
-        query += ')'
-        with path_object.open(encoding='UTF-8') as file:
-            element = yaml.safe_load(file)
-
-            self._Location[self._counter]["id"] = element['constellationID']
-            self._Location[self._counter]["name"] = self._get_name(element['constellationID'])
-
-            # print('SDE: parsing data for constellation ' + self._Location[self._counter]["name"])
-            print(f'SDE: Parsing {self._Location[0]["name"]} > {self._Location[1]["name"]} >')
-            params = {}
-            params['id'] = element['constellationID']
-            params['name'] = self._Location[self._counter]["name"]
-            params['regionId'] = self._Location[0]["id"]
-            params['radius'] = element["radius"]
-            params['centerX'] = element["center"][0]
-            params['centerY'] = element["center"][1]
-            params['centerZ'] = element["center"][2]
-            if self._config.extended_coordinates:
-                params['maxX'] = element["max"][0]
-                params['maxY'] = element["max"][1]
-                params['maxZ'] = element["max"][2]
-                params['minX'] = element["min"][0]
-                params['minY'] = element["min"][1]
-                params['minZ'] = element["min"][2]
-            cur.execute(query, params)
-        cur.close()
+    def _parse_gates(self, rows):
+        self._writer.add_many('mapSystemGates', rows)
+        for row in rows:
+            self._gates[row[0]] = (row[1], row[6])
 
-    def _parse_region(self, path_object):
+    def _load_gates(self):
+        """
+        Reads every gate from the database, incremental builds only parse the
+        gates of the changed systems
+        """
+        self._writer.flush()
         cur = self._db_driver.connection.cursor()
-        # query creation
-        query = ('INSERT INTO mapRegions(regionId, regionName, factionId, centerX, centerY, centerZ'
-                 ',nebula ,wormholeClassId ')
-        if self._config.extended_coordinates:
-            query += ',maxX ,maxY ,maxZ ,minX ,minY ,minZ'
-        query += (') VALUES (:id , :name, :factionId, :centerX, :centerY, :centerZ, :nebula, '
-                  ':whclass')
-        if self._config.extended_coordinates:
-            query += ',:maxX ,:maxY ,:maxZ ,:minX ,:minY ,:minZ'
-        query += ')'
-
-        with path_object.open(encoding='UTF-8') as file:
-            region = yaml.safe_load(file)
-            self._Location[self._counter]["id"] = region['regionID']
-            self._Location[self._counter]["name"] = self._get_name(region['regionID'])
-
-            print(f'SDE: Parsing {self._Location[0]["name"]} > > ')
-            # print('SDE: parsing data for region ' + self._Location[self._counter]["name"])
-            params = {}
-            params['id'] = region['regionID']
-            params['name'] = self._Location[self._counter]["name"]
-            params['factionId'] = None
-            if 'factionID' in region:
-                params['factionId'] = region['factionID']
-            params['nebula'] = region["nebula"]
-            params['whclass'] = None
-            if 'wormholeClassID' in region:
-                params['whclass'] = region["wormholeClassID"]
-            params['centerX'] = region["center"][0]
-            params['centerY'] = region["center"][1]
-            params['centerZ'] = region["center"][2]
-            if self._config.extended_coordinates:
-                params['maxX'] = region["max"][0]
-                params['maxY'] = region["max"][1]
-                params['maxZ'] = region["max"][2]
-                params['minX'] = region["min"][0]
-                params['minY'] = region["min"][1]
-                params['minZ'] = region["min"][2]
-            cur.execute(query, params)
+        cur.execute('SELECT systemGateId, solarSystemId, destination FROM mapSystemGates;')
+        self._gates = {gate_id: (system_id, destination) for gate_id, system_id, destination in cur}
         cur.close()
 
-    def _parse_gates(self, node):
-        cur = self._db_driver.connection.cursor()
-        query = ('INSERT INTO mapSystemGates (systemGateId, solarSystemId, typeId, '
-                 'positionX, positionY, positionZ, destination) '
-                 'VALUES (:id, :solarSystemId, :typeId, :posX, '
-                 ':posY, :posZ, :destination );')
-        for element in node.items():
-            params = {}
-            params['id'] = element[0]
-            params['solarSystemId'] = self._Location[2]["id"]
-            params['typeId'] = element[1]['typeID']
-            params['posX'] = element[1]['position'][0]
-            params['posY'] = element[1]['position'][1]
-            params['posZ'] = element[1]['position'][2]
-            params['destination'] = element[1]['destination']
-            cur.execute(query, params)
-        cur.close()
+    def _system_pairs(self):
+        """
+        Connected systems as (systemA, systemB) pairs with systemA > systemB
+        sorted, the gates whose destination wasn't parsed are ignored
+        """
+        pairs = set()
+        for system_id, destination in self._gates.values():
+            other = self._gates.get(destination)
+            if other is not None and system_id != other[0]:
+                pairs.add((max(system_id, other[0]), min(system_id, other[0])))
+        return sorted(pairs)
 
     def parse_connections(self):
+        """
+        Writes the connections between systems from the parsed gates, every
+        pair of systems once with its number in order as systemConnectionId,
+        and both directions on mapSystemNeighbors
+        """
+        self._writer.flush()
+        pairs = self._system_pairs()
         cur = self._db_driver.connection.cursor()
-        query = ('INSERT INTO mapSystemConnections AS msc (systemConnectionId, systemA, systemB)'
-                'SELECT LOWER(HEX(RANDOMBLOB(8))), msga.solarSystemId, msgb.solarSystemId '
-                'FROM mapSystemGates AS msga '
-                'INNER JOIN mapSystemGates AS msgb ON(msgb.systemGateId = msga.destination) '
-                'WHERE msga.solarsystemId > msgb.solarsystemId')
-        cur.execute(query)
+        cur.execute('DELETE FROM mapSystemConnections;')
+        cur.execute('DELETE FROM mapSystemNeighbors;')
+        cur.executemany('INSERT INTO mapSystemConnections (systemConnectionId, systemA, systemB) '
+                        'VALUES (?,?,?);',
+                        ((number, pair[0], pair[1]) for number, pair in enumerate(pairs, 1)))
+        neighbors = sorted(pairs + [(system_b, system_a) for system_a, system_b in pairs])
+        cur.executemany('INSERT INTO mapSystemNeighbors (solarSystemId, neighborId) VALUES (?,?);',
+                        neighbors)
         cur.close()
+        print(f'SDE: {len(pairs)} system connections stored')
 
-    def _parse_moons(self, planet_id, node):
+    def _has_jump_table(self):
         cur = self._db_driver.connection.cursor()
-        cont = 1
-        query = ('INSERT INTO mapMoons (moonId, solarSystemId, moonIndex, planetId, typeid, radius,'
-                 ' positionX, positionY, positionZ) VALUES (:id, :solarSystemId, :moonIndex, '
-                 ':planetId ,:typeId, :radius, :posX, :posY, :posZ );')
-        for element in node.items():
-            params = {}
-            params['id'] = element[0]
-            params['solarSystemId'] = self._Location[2]['id']
-            params['moonIndex'] = cont
-            params['planetId'] = planet_id
-            params['typeId'] = element[1]["typeID"]
-            params['radius'] = None
-            if 'statistics' in element[1]:
-                params['radius'] = element[1]['statistics']['radius']
-            params['posX'] = element[1]['position'][0]
-            params['posY'] = element[1]['position'][1]
-            params['posZ'] = element[1]['position'][2]
-            cur.execute(query, params)
-            cont += 1
+        cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='mapJumpTable';")
+        exists = cur.fetchone() is not None
         cur.close()
+        return exists
 
-    def _parse_planets(self, node):
-        cur = self._db_driver.connection.cursor()
-        query = ('INSERT INTO mapPlanets (planetId, solarSystemId, planetaryIndex,'
-                 'fragmented, radius, locked, typeId, '
-                 'positionX, positionY, positionZ) VALUES (:id, :solarSystemId, '
-                 ':planetIndex, :fragmented, :radius, '
-                 ':locked, :typeId, :posX, :posY, :posZ );')
-        for element in node.items():
-            params = {}
-            params['id'] = element[0]
-            params['solarSystemId'] = self._Location[2]["id"]
-            params['planetIndex'] = element[1]['celestialIndex']
-            params['fragmented'] = element[1]['statistics']['fragmented']
-            params['radius'] = element[1]['statistics']['radius']
-            params['locked'] = element[1]['statistics']['locked']
-            params['typeId'] = element[1]['typeID']
-            params['posX'] = element[1]['position'][0]
-            params['posY'] = element[1]['position'][1]
-            params['posZ'] = element[1]['position'][2]
-            cur.execute(query, params)
-            if 'moons' in element[1] and self.configuration.with_moons:
-                self._parse_moons(element[0], element[1]['moons'])
-        cur.close()
+    def build_jump_table(self):
+        """
+        Stores on mapJumpTable the jumps between every pair of known space
+        systems, see Router.jump_table
+        """
+        self._writer.flush()
+        router = Router.from_database(self._db_driver.connection)
+        total = router.save_jump_table(self._db_driver.connection)
+        print(f'SDE: jump table of {total} systems stored')
 
-    def _parse_star(self, node):
-        params = {}
-        cur = self._db_driver.connection.cursor()
-        query = ('INSERT INTO mapStars ( starId, solarSystemId, locked, '
-                 'radius, startypeId ) VALUES '
-                 '(:starId, :solarSystemId, :locked, :radius, :typeId)')
-        params['starId'] = node['id']
-        params['solarSystemId'] = self._Location[2]['id']
-        params['locked'] = node['statistics']['locked']
-        params['radius'] = node['statistics']['radius']
-        params['typeId'] = self._stars.entity_type[node['typeID']]
-        cur.execute(query, params)
-        cur.close()
+    def build_spatial_index(self):
+        """
+        Creates the R*Tree tables of the systems (with their min/max bounds when
+        extended_coordinates is on), planets, moons and gates
+        """
+        if not SpatialIndex.available():
+            print('SDE: SQLite was built without R*Tree, spatial index skipped')
+            return
+        if self._writer is not None:
+            self._writer.flush()
+        index = SpatialIndex(self._db_driver.connection)
+        tables = {'mapSolarSystems': self._config.extended_coordinates, 'mapPlanets': False}
+        if self._config.with_moons:
+            tables['mapMoons'] = False
+        if self._config.with_gates:
+            tables['mapSystemGates'] = False
+        for table, bounds in tables.items():
+            total = index.build(table, bounds)
+            print(f'SDE: {total} {table} coordinates indexed on {index.index_name(table)}')
+
+    def export_snapshot(self, directory=None):
+        """
+        Writes the columnar snapshot of the systems, connections, planets, moons
+        and stars on directory (snapshot_directory by default), returns the rows
+        written
+        """
+        if self._writer is not None:
+            self._writer.flush()
+        directory = self._config.snapshot_directory if directory is None else directory
+        total = SnapshotExporter(self._db_driver.connection).export(directory)
+        print(f'SDE: snapshot of {total} rows written on {directory}')
+        return total
+
+    def project_coordinates(self, algorithm=None, projected_axis=None, matrix=None):
+        """
+        Calculate projX, projY and projZ of every system (and planets, moons and
+        gates with project_celestials) in one pass, the configured projection is
+        used unless another one is given
+        """
+        if self._writer is not None:
+            self._writer.flush()
+        if algorithm is None:
+            algorithm = self._config.projection_algorithm
+            matrix = self._config.projection_matrix if matrix is None else matrix
+        if projected_axis is None:
+            projected_axis = self._config.projected_axis
+        tables = ['mapSolarSystems']
+        if self._config.project_celestials:
+            tables += ['mapPlanets', 'mapMoons', 'mapSystemGates']
+        engine = ProjectionEngine(self._db_driver.connection)
+        for table in tables:
+            total = engine.project_table(table, algorithm, projected_axis, matrix)
+            print(f'SDE: {total} {table} coordinates projected')
+
+    def _parse_moons(self, rows):
+        self._writer.add_many('mapMoons', rows)
+
+    def _parse_planets(self, rows):
+        self._writer.add_many('mapPlanets', rows)
+
+    def _parse_star(self, row):
+        if self._pending_stars is not None:
+            # with selective_types the star types are parsed after the universe
+            self._pending_stars.append(row)
+            return
+        self._writer.add('mapStars', row[:4] + (self._stars.entity_type[row[4]],))
 
     def _parse_names(self):
         """
-        Load the all the names used by entities and dump it into a temp table
+        Load the names used by regions, constellations and systems into memory
         """
-        cur = self._db_driver.connection.cursor()
-        names_file = Path(self.yaml_directory).joinpath('bsd', 'invNames.yaml')
-        if not names_file.exists():
+        names_file = 'bsd/invNames.yaml'
+        if not self._source.exists(names_file):
             raise FileNotFoundError
-        query = 'INSERT INTO invNames (itemId, itemName) VALUES (:id, :name);'
-        with names_file.open(encoding='UTF-8') as file:
-            names = yaml.safe_load(file)
-
-        total = len(names)
+        self._names = NameIndex()
         cont = 0
-        for name in names:
-            params = {}
-            params['id'] = name['itemID']
-            params['name'] = name['itemName']
-            cur.execute(query, params)
+        for name in self._cache.iterate_sequence(self._source, names_file):
+            self._names.add(name['itemID'], name['itemName'])
             cont += 1
-            print(f'SDE: Parsing {total} names [{round((cont / total)*100,2)}%]  \r', end="")
-        cur.close()
-        print(f'SDE: {total} names parsed                  ')
+        print(f'SDE: {cont} names parsed, {len(self._names)} kept                  ')
 
     def _get_name(self, name_id):
-        result = ''
-        cur = self._db_driver.connection.cursor()
-        query = 'SELECT itemName FROM invNames WHERE itemId = ?;'
-        rows = cur.execute(query, (name_id,))
-        for row in rows:
-            result = row[0]
-        cur.close()
-        return result
+        return self._names.get(name_id)
 
     def close(self):
-        """Drop unnecesary data, commit transactions and close the database"""
-        query = 'DROP TABLE invNames;'
-        cur = self._db_driver.connection.cursor()
-        cur.execute(query)
-        self._db_driver.connection.commit()
-        if self._db_type == DatabaseType.SQLITE:
-            query = 'VACUUM;'
-            cur.execute(query)
-        cur.close()
+        """
+        Write pending rows, finish the bulk load session, commit transactions and
+        publish the database when it was built on build_location
+        """
+        with self._stage('finalize'):
+            if self._writer is not None:
+                self._writer.flush()
+            if self._db_driver.bulk_load:
+                self._db_driver.end_bulk_load(self._config.journal_mode)
+            self._db_driver.commit()
+        if self._db_driver.build_location is not None:
+            # the connection is replaced, the stage doesn't count its changes
+            with self._instrumentation.stage('publish'):
+                self._db_driver.publish(self._config.journal_mode)
+            self._writer = None
+        self._cache.evict()
+        self._source.close()
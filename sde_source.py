@@ -0,0 +1,219 @@
+# -*- coding: UTF-8 -*-
+"""
+Provides a common way to read the SDE files from an extracted
+directory or directly from the sde.zip archive
+"""
+import hashlib
+import os
+import posixpath
+import zipfile
+from pathlib import Path
+
+
+class SourceNotFoundError(Exception):
+    """
+    The SDE source is neither a directory nor a zip file
+    """
+
+
+class SdeSource():
+    """
+    Base class for SDE sources, every file is named by its POSIX path
+    relative to the SDE root (e.g. 'fsd/typeIDs.yaml')
+    """
+    buffer_size = 1024**2
+
+    @classmethod
+    def create(cls, location):
+        """Returns the source that can read the given directory or zip file"""
+        location = Path(location)
+        if location.is_dir():
+            return DirectorySource(location)
+        if location.is_file() and zipfile.is_zipfile(location):
+            return ZipSource(location)
+        raise SourceNotFoundError(f'{location} is not a directory or a zip file')
+
+    @property
+    def location(self):
+        """the directory or zip file used as source"""
+        raise NotImplementedError
+
+    def open(self, name):
+        """Opens a file in binary mode"""
+        raise NotImplementedError
+
+    def exists(self, name):
+        """True if the file exists"""
+        raise NotImplementedError
+
+    def size(self, name):
+        """The (uncompressed) size of a file"""
+        raise NotImplementedError
+
+    def list_directories(self, name):
+        """Names of the directories inside a directory, sorted"""
+        raise NotImplementedError
+
+    def list_files(self, name, suffix=''):
+        """Names of every file below a directory that ends with the suffix, sorted"""
+        raise NotImplementedError
+
+    def read_bytes(self, name):
+        """Reads the whole content of a file"""
+        with self.open(name) as file:
+            return file.read()
+
+    def digest(self, name):
+        """A string that changes when the content of the file changes"""
+        digest = hashlib.md5()
+        with self.open(name) as file:
+            for buffer in iter(lambda: file.read(self.buffer_size), b''):
+                digest.update(buffer)
+        return digest.hexdigest()
+
+    def cache_digest(self, name):
+        """The digest that identifies the content of a file in the parse cache"""
+        return self.digest(name)
+
+    def signature(self, name):
+        """
+        A cheap string that changes when a file is modified (path, mtime and
+        size), None when digest is already cheap
+        """
+        return None
+
+    def close(self):
+        """Releases the resources held by the source"""
+
+
+class DirectorySource(SdeSource):
+    """Reads the SDE from an extracted directory"""
+
+    def __init__(self, directory):
+        self._directory = Path(directory)
+
+    @property
+    def location(self):
+        return self._directory
+
+    def _path(self, name):
+        return self._directory.joinpath(*name.split('/')) if name else self._directory
+
+    def open(self, name):
+        return self._path(name).open('rb')
+
+    def exists(self, name):
+        return self._path(name).is_file()
+
+    def size(self, name):
+        return self._path(name).stat().st_size
+
+    def signature(self, name):
+        stat = self._path(name).stat()
+        return f'{self._path(name).resolve()}:{stat.st_mtime_ns}:{stat.st_size}'
+
+    def list_directories(self, name):
+        path = self._path(name)
+        if not path.is_dir():
+            return []
+        return sorted(posixpath.join(name, element.name)
+                      for element in path.iterdir() if element.is_dir())
+
+    def list_files(self, name, suffix=''):
+        path = self._path(name)
+        if not path.is_dir():
+            return []
+        return sorted(element.relative_to(self._directory).as_posix()
+                      for element in path.rglob('*' + suffix) if element.is_file())
+
+
+class ZipSource(SdeSource):
+    """
+    Reads the SDE members straight from sde.zip, the directory tree is
+    built from the central directory so nothing is extracted to disk
+    """
+    _archive = None
+    _pid = None
+    markers = ('bsd/invNames.yaml', 'fsd/typeIDs.yaml')
+
+    def __init__(self, zip_file):
+        self._zip_file = Path(zip_file)
+        self._members = {}
+        self._directories = {}
+        self._open_archive()
+        # the members can be stored below a root directory (e.g. 'sde/')
+        prefix = ''
+        for info in self._archive.infolist():
+            marker = next((marker for marker in self.markers
+                           if info.filename.endswith(marker)), None)
+            if marker is not None:
+                prefix = info.filename[:-len(marker)]
+                break
+        for info in self._archive.infolist():
+            if info.is_dir() or not info.filename.startswith(prefix):
+                continue
+            name = info.filename[len(prefix):]
+            self._members[name] = info
+            parent = posixpath.dirname(name)
+            while parent:
+                grand_parent = posixpath.dirname(parent)
+                children = self._directories.setdefault(grand_parent, set())
+                if parent in children:
+                    break
+                children.add(parent)
+                parent = grand_parent
+
+    def _open_archive(self):
+        # a forked worker can't share the handle (and its file position) with the parent
+        if self._archive is not None and self._pid != os.getpid():
+            self._archive = None
+        if self._archive is None:
+            self._archive = zipfile.ZipFile(self._zip_file, 'r')
+            self._pid = os.getpid()
+
+    def __getstate__(self):
+        # worker processes open their own handle of the archive
+        state = self.__dict__.copy()
+        state['_archive'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    @property
+    def location(self):
+        return self._zip_file
+
+    def open(self, name):
+        self._open_archive()
+        return self._archive.open(self._members[name])
+
+    def exists(self, name):
+        return name in self._members
+
+    def size(self, name):
+        return self._members[name].file_size
+
+    def list_directories(self, name):
+        return sorted(self._directories.get(name, ()))
+
+    def list_files(self, name, suffix=''):
+        prefix = name + '/' if name else ''
+        return sorted(member for member in self._members
+                      if member.startswith(prefix) and member.endswith(suffix))
+
+    def digest(self, name):
+        # the CRC stored in the central directory avoids decompressing the member
+        info = self._members[name]
+        return f'{info.CRC:08x}-{info.file_size}'
+
+    def cache_digest(self, name):
+        # the 32-bit CRC alone is too weak to share parsed data between releases
+        info = self._members[name]
+        return f'{info.CRC:08x}-{info.file_size}-{info.compress_size}-{info.compress_type}'
+
+    def close(self):
+        """Closes the archive"""
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
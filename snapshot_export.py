@@ -0,0 +1,145 @@
+# -*- coding: UTF-8 -*-
+"""
+Provides the columnar snapshot of the map tables, every column is written as
+a NumPy .npy file (<directory>/<table>/<column>.npy) with the rows sorted by
+the table ID, so the ID column is the index to find a row. Clients map the
+files without parsing them, e.g.
+
+    ids = numpy.load('snapshot/mapSolarSystems/solarSystemId.npy', mmap_mode='r')
+    security = numpy.load('snapshot/mapSolarSystems/security.npy', mmap_mode='r')
+    security[numpy.searchsorted(ids, 30000142)]
+
+The files are written without NumPy, it is only needed to read them
+"""
+import json
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+SNAPSHOT_FILENAME = 'snapshot.json'
+
+
+class SnapshotExporter():
+    """
+    Writes the tables as fixed width columns: integers as int64, booleans as
+    int8 (NULL is -1 on both), floats as float64 (NULL is NaN) and text as
+    UTF-8 bytes padded with zeros to the longest value
+    """
+    # exported tables and the ID column used to sort them
+    tables = {'mapSolarSystems': 'solarSystemId',
+              'mapSystemConnections': 'systemConnectionId',
+              'mapPlanets': 'planetId',
+              'mapMoons': 'moonId',
+              'mapStars': 'starId'}
+
+    @staticmethod
+    def column_type(declared):
+        """npy type of a column from the type declared on the table"""
+        declared = declared.upper()
+        if 'BOOL' in declared:
+            return '|i1'
+        if 'INT' in declared:
+            return '<i8'
+        if 'FLOAT' in declared or 'REAL' in declared or 'DOUBLE' in declared:
+            return '<f8'
+        return '|S'
+
+    @staticmethod
+    def npy_header(descr, rows):
+        """header of a version 1.0 .npy file of a single dimension array"""
+        header = repr({'descr': descr, 'fortran_order': False, 'shape': (rows,)})
+        # magic (6), version (2) and header length (2), the data starts aligned to 64 bytes
+        header += ' ' * (-(10 + len(header) + 1) % 64) + '\n'
+        return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1')
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def _columns(self, table):
+        cur = self._connection.cursor()
+        columns = [(row[1], self.column_type(row[2]))
+                   for row in cur.execute(f'PRAGMA table_info({table});')]
+        cur.close()
+        return columns
+
+    @staticmethod
+    def _pack(descr, values):
+        """the column values as the bytes of the array, returns the final descr too"""
+        if descr == '|S':
+            encoded = [b'' if value is None else str(value).encode('UTF-8') for value in values]
+            width = max((len(value) for value in encoded), default=0) or 1
+            return f'|S{width}', b''.join(value.ljust(width, b'\0') for value in encoded)
+        if descr == '<f8':
+            data = array('d', (float('nan') if value is None else value for value in values))
+        elif descr == '|i1':
+            data = array('b', (-1 if value is None else int(value) for value in values))
+        else:
+            data = array('q', (-1 if value is None else int(value) for value in values))
+        if sys.byteorder == 'big':
+            data.byteswap()
+        return descr, data.tobytes()
+
+    @staticmethod
+    def _write(path, content):
+        """writes a file and moves it in place, readers never see a partial file"""
+        temporary = path.with_name(path.name + '.part')
+        with open(temporary, 'wb') as file:
+            for part in content:
+                file.write(part)
+        os.replace(temporary, path)
+
+    def export_table(self, table, directory):
+        """
+        Writes every column of a table on directory/table, returns the
+        description of the columns for the snapshot file
+        """
+        key = self.tables[table]
+        columns = self._columns(table)
+        cur = self._connection.cursor()
+        rows = cur.execute(f'SELECT {", ".join(name for name, _ in columns)} '
+                           f'FROM {table} ORDER BY {key};').fetchall()
+        cur.close()
+        output = Path(directory).joinpath(table)
+        output.mkdir(parents=True, exist_ok=True)
+        description = {}
+        for position, (name, descr) in enumerate(columns):
+            descr, data = self._pack(descr, [row[position] for row in rows])
+            self._write(output.joinpath(name + '.npy'), (self.npy_header(descr, len(rows)), data))
+            description[name] = descr
+        return {'rows': len(rows), 'key': key, 'columns': description}
+
+    def export(self, directory, tables=None):
+        """
+        Writes the snapshot of the tables (every exported table by default)
+        and the snapshot.json that describes it, returns the rows written
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        snapshot = {'version': 1, 'tables': {}}
+        for table in tables or self.tables:
+            snapshot['tables'][table] = self.export_table(table, directory)
+        content = json.dumps(snapshot, indent=1).encode('UTF-8')
+        self._write(directory.joinpath(SNAPSHOT_FILENAME), (content,))
+        return sum(table['rows'] for table in snapshot['tables'].values())
+
+
+def load_snapshot(directory):
+    """
+    Maps every column of a snapshot with NumPy, returns a dict of tables
+    with a dict of read-only arrays per table
+    """
+    if numpy is None:
+        raise ImportError('NumPy is needed to load a snapshot')
+    directory = Path(directory)
+    with open(directory.joinpath(SNAPSHOT_FILENAME), 'rt', encoding='UTF-8') as file:
+        snapshot = json.load(file)
+    return {table: {column: numpy.load(directory.joinpath(table, column + '.npy'), mmap_mode='r')
+                    for column in description['columns']}
+            for table, description in snapshot['tables'].items()}
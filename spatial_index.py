@@ -0,0 +1,172 @@
+# -*- coding: UTF-8 -*-
+"""
+Provides the R*Tree spatial indexes of the systems and celestials, they are
+SQLite virtual tables named <table>Rtree, e.g. the systems in jump range
+
+    SpatialIndex(sqlite3.connect('sde.db')).systems_within(30000142, 6.0)
+"""
+import math
+import sqlite3
+
+LIGHT_YEAR = 9460730472580800 # meters
+
+
+class SpatialIndex():
+    """
+    Builds the R*Tree tables from the coordinates already stored and answers
+    radius and nearest neighbour queries. The R*Tree keeps 32 bits floats
+    so it only selects the candidates, the distances are calculated with
+    the coordinates of the table
+    """
+    # id column, coordinate columns and the column stored with every box
+    tables = {'mapSolarSystems': ('solarSystemId', ('centerX', 'centerY', 'centerZ'), None),
+              'mapPlanets': ('planetId', ('positionX', 'positionY', 'positionZ'),
+                             'solarSystemId'),
+              'mapMoons': ('moonId', ('positionX', 'positionY', 'positionZ'), 'solarSystemId'),
+              'mapSystemGates': ('systemGateId', ('positionX', 'positionY', 'positionZ'),
+                                 'solarSystemId')}
+    bounds_columns = (('minX', 'maxX'), ('minY', 'maxY'), ('minZ', 'maxZ'))
+
+    @staticmethod
+    def index_name(table):
+        """name of the R*Tree table of a table"""
+        return f'{table}Rtree'
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._totals = {}
+
+    def build(self, table, bounds=False):
+        """
+        Creates (again) the R*Tree of a table, every row is a point unless
+        bounds is True, then the box goes from the min to the max columns.
+        Returns the rows indexed
+        """
+        id_column, coordinates, auxiliary = self.tables[table]
+        index = self.index_name(table)
+        columns = 'id, minX, maxX, minY, maxY, minZ, maxZ'
+        if auxiliary is not None:
+            columns += f', +{auxiliary}'
+        boxes = []
+        for coordinate, (low, high) in zip(coordinates, self.bounds_columns):
+            if bounds:
+                # the center is always inside the box
+                boxes += [f'MIN({low}, {coordinate})', f'MAX({high}, {coordinate})']
+            else:
+                boxes += [coordinate, coordinate]
+        if auxiliary is not None:
+            boxes.append(auxiliary)
+        cur = self._connection.cursor()
+        cur.execute(f'DROP TABLE IF EXISTS {index};')
+        cur.execute(f'CREATE VIRTUAL TABLE {index} USING rtree({columns});')
+        cur.execute(f'INSERT INTO {index} SELECT {id_column}, {", ".join(boxes)} '
+                    f'FROM {table};')
+        total = cur.rowcount
+        cur.close()
+        self._totals.clear()
+        return total
+
+    def exists(self, table):
+        """True if the R*Tree of the table was built"""
+        cur = self._connection.cursor()
+        cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?;",
+                    (self.index_name(table),))
+        found = cur.fetchone() is not None
+        cur.close()
+        return found
+
+    def _candidates(self, table, point, radius, system_id=None):
+        """rows inside the box around the sphere, with their distance"""
+        id_column, coordinates, auxiliary = self.tables[table]
+        index = self.index_name(table)
+        query = (f'SELECT r.id, t.{coordinates[0]}, t.{coordinates[1]}, t.{coordinates[2]} '
+                 f'FROM {index} AS r INNER JOIN {table} AS t ON(t.{id_column} = r.id) '
+                 'WHERE r.maxX >= ? AND r.minX <= ? AND r.maxY >= ? AND r.minY <= ? '
+                 'AND r.maxZ >= ? AND r.minZ <= ?')
+        parameters = []
+        for value in point:
+            parameters += [value - radius, value + radius]
+        if system_id is not None and auxiliary is not None:
+            query += f' AND r.{auxiliary} = ?'
+            parameters.append(system_id)
+        cur = self._connection.cursor()
+        rows = cur.execute(query, parameters).fetchall()
+        cur.close()
+        return [(row[0], math.dist(point, row[1:])) for row in rows]
+
+    def within(self, table, point, radius, system_id=None):
+        """
+        (id, distance) of the rows up to radius meters from point sorted by
+        distance, celestials can be limited to one solar system
+        """
+        found = [row for row in self._candidates(table, point, radius, system_id)
+                 if row[1] <= radius]
+        found.sort(key=lambda row: (row[1], row[0]))
+        return found
+
+    def _total(self, table, system_id=None):
+        """rows indexed (of a solar system), kept until the index is built again"""
+        auxiliary = self.tables[table][2]
+        if auxiliary is None:
+            system_id = None
+        key = (table, system_id)
+        if key not in self._totals:
+            query = f'SELECT COUNT(*) FROM {self.index_name(table)}'
+            parameters = ()
+            if system_id is not None:
+                query += f' WHERE {auxiliary} = ?'
+                parameters = (system_id,)
+            cur = self._connection.cursor()
+            self._totals[key] = cur.execute(query, parameters).fetchone()[0]
+            cur.close()
+        return self._totals[key]
+
+    def nearest(self, table, point, count, system_id=None, radius=LIGHT_YEAR):
+        """
+        (id, distance) of the count rows nearest to point, the search starts
+        with a box of the given radius and grows until it has enough rows
+        """
+        total = self._total(table, system_id)
+        while True:
+            candidates = self._candidates(table, point, radius, system_id)
+            found = [row for row in candidates if row[1] <= radius]
+            if len(found) >= count or len(candidates) >= total:
+                break
+            radius *= 4
+        # every candidate is a row closer than radius or one outside the sphere
+        candidates.sort(key=lambda row: (row[1], row[0]))
+        return candidates[:count]
+
+    def _system_center(self, system_id):
+        cur = self._connection.cursor()
+        center = cur.execute('SELECT centerX, centerY, centerZ FROM mapSolarSystems '
+                             'WHERE solarSystemId = ?;', (system_id,)).fetchone()
+        cur.close()
+        if center is None:
+            raise KeyError(system_id)
+        return center
+
+    def systems_within(self, system_id, light_years):
+        """(solarSystemId, light years) of the other systems in range of a system"""
+        found = self.within('mapSolarSystems', self._system_center(system_id),
+                            light_years * LIGHT_YEAR)
+        return [(other, distance / LIGHT_YEAR) for other, distance in found
+                if other != system_id]
+
+    def nearest_systems(self, system_id, count):
+        """(solarSystemId, light years) of the count systems nearest to a system"""
+        found = self.nearest('mapSolarSystems', self._system_center(system_id), count + 1)
+        return [(other, distance / LIGHT_YEAR) for other, distance in found
+                if other != system_id][:count]
+
+    @staticmethod
+    def available():
+        """True if the SQLite library was compiled with R*Tree"""
+        connection = sqlite3.connect(':memory:')
+        try:
+            connection.execute('CREATE VIRTUAL TABLE test USING rtree(id, x, y);')
+        except sqlite3.OperationalError:
+            return False
+        finally:
+            connection.close()
+        return True
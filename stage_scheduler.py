@@ -0,0 +1,137 @@
+# -*- coding: UTF-8 -*-
+"""
+Provides a small scheduler of build stages, every stage declares the values
+that it needs (inputs) and the ones that it returns (outputs) and starts as
+soon as its inputs are ready, so independent stages run at the same time, e.g.
+
+    scheduler = StageScheduler()
+    scheduler.add('regions', read_regions, outputs=('regions',))
+    scheduler.add('maps', fetch_maps, inputs=('regions',), outputs=('maps',))
+    scheduler.add('database', build, outputs=('built',), writes_database=True)
+    scheduler.add('external', enrich, inputs=('built', 'maps'), writes_database=True)
+    results = scheduler.run()
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class StageGraphError(Exception):
+    """
+    The stages can't be scheduled: an input nobody provides, an output
+    provided twice or stages that depend on each other
+    """
+
+
+class Stage():
+    """
+    A function called with the values of its inputs, it returns the value of
+    its only output or a tuple with one value per output
+    """
+
+    def __init__(self, name, function, inputs=(), outputs=(), writes_database=False):
+        self.name = name
+        self.function = function
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.writes_database = writes_database
+
+    def run(self, arguments, database_lock):
+        """Calls the function with the input values, returns a dict with the outputs"""
+        if self.writes_database:
+            with database_lock:
+                result = self.function(*arguments)
+        else:
+            result = self.function(*arguments)
+        if not self.outputs:
+            return {}
+        if len(self.outputs) == 1:
+            return {self.outputs[0]: result}
+        return dict(zip(self.outputs, result))
+
+
+class StageScheduler():
+    """
+    Runs the stages on a thread pool in dependency order. The stages that
+    write the database hold a lock, so there is only one writer at a time.
+    When a stage fails no other stage is started, the ones running are
+    waited for and the error is raised
+    """
+
+    @property
+    def stages(self):
+        """stages in the order they were added"""
+        return list(self._stages.values())
+
+    def __init__(self, max_workers=4):
+        self._max_workers = max(1, max_workers)
+        self._stages = {}
+        self._database_lock = threading.Lock()
+
+    def add(self, name, function, inputs=(), outputs=(), writes_database=False):
+        """Adds a stage, see Stage"""
+        if name in self._stages:
+            raise StageGraphError(f'The stage {name} was already added.')
+        self._stages[name] = Stage(name, function, inputs, outputs, writes_database)
+        return self._stages[name]
+
+    def order(self, values=()):
+        """
+        Names of the stages in an order that satisfies the dependencies,
+        values are the inputs known before running
+        """
+        providers = {}
+        for stage in self._stages.values():
+            for output in stage.outputs:
+                if output in providers or output in values:
+                    raise StageGraphError(f'{output} is provided more than once.')
+                providers[output] = stage.name
+        for stage in self._stages.values():
+            for name in stage.inputs:
+                if name not in providers and name not in values:
+                    raise StageGraphError(f'No stage provides {name}, needed by {stage.name}.')
+        available = set(values)
+        pending = list(self._stages.values())
+        order = []
+        while pending:
+            ready = [stage for stage in pending if available.issuperset(stage.inputs)]
+            if not ready:
+                names = ', '.join(stage.name for stage in pending)
+                raise StageGraphError(f'The stages {names} depend on each other.')
+            for stage in ready:
+                pending.remove(stage)
+                order.append(stage.name)
+                available.update(stage.outputs)
+        return order
+
+    def run(self, **values):
+        """
+        Runs every stage, the keyword arguments are inputs known before
+        running. Returns a dict with the initial values and every output
+        """
+        self.order(values)
+        values = dict(values)
+        pending = list(self._stages.values())
+        running = {}
+        error = None
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            while pending or running:
+                if error is None:
+                    for stage in [stage for stage in pending
+                                  if all(name in values for name in stage.inputs)]:
+                        pending.remove(stage)
+                        arguments = [values[name] for name in stage.inputs]
+                        running[executor.submit(stage.run, arguments,
+                                                self._database_lock)] = stage
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    running.pop(future)
+                    try:
+                        values.update(future.result())
+                    except Exception as stage_error:
+                        if error is None:
+                            error = stage_error
+        if error is not None:
+            raise error
+        return values
@@ -0,0 +1,142 @@
+# -*- coding: UTF-8 -*-
+"""
+Provides the parsing of solarsystem.staticdata files, it doesn't touch
+the database so it can be executed on worker processes
+"""
+import multiprocessing
+from parse_cache import ParseCache
+
+# reader of a worker process, sent once by init_worker instead of with every task
+_worker_reader = None
+
+
+def worker_context():
+    """
+    Start method of the worker pools. Forking while other threads hold locks
+    (e.g. the downloads of the stage scheduler) can deadlock the workers, so
+    they are started by a fork server or spawned where it isn't available
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def init_worker(reader):
+    """Initializer of the parse workers, keeps the reader for read_in_worker"""
+    global _worker_reader
+    _worker_reader = reader
+
+
+def read_in_worker(work_item):
+    """Reads a work item with the reader given to init_worker"""
+    return _worker_reader.read(work_item)
+
+
+def read_regions(source, cache=None, directory_name='fsd/universe/eve', last_region=11000000):
+    """
+    (regionId, regionName) of the regions of a universe directory below
+    last_region, read from the SDE without a database. invNames is only read
+    until every region name is found
+    """
+    cache = cache if cache is not None else ParseCache()
+    region_ids = set()
+    for region_dir in source.list_directories(directory_name):
+        region_file = region_dir + '/region.staticdata'
+        if source.exists(region_file):
+            region_id = cache.load(source, region_file)['regionID']
+            if region_id < last_region:
+                region_ids.add(region_id)
+    names = {}
+    items = cache.iterate_sequence(source, 'bsd/invNames.yaml')
+    for name in items:
+        if name['itemID'] in region_ids:
+            names[name['itemID']] = name['itemName']
+            if len(names) == len(region_ids):
+                break
+    items.close()
+    return sorted(names.items())
+
+
+class SystemReader():
+    """
+    Turns a solar system file into the rows that SdeParser writes, every work item
+    carries the region and constellation where the system is located
+    """
+    _config = None
+    _source = None
+    _cache = None
+
+    def __init__(self, configuration, source, cache=None):
+        self._config = configuration
+        self._source = source
+        self._cache = cache if cache is not None else ParseCache()
+
+    @staticmethod
+    def has_celestials(solar_system_id):
+        """Wormhole (Jove) and Abyssal systems don't have gates, stars and planets"""
+        return (solar_system_id < 32000000
+                or 33000000 <= solar_system_id < 34000000
+                or solar_system_id >= 35000000)
+
+    def read(self, work_item):
+        """
+        Parse a (file name, region, constellation) work item and return a dict with
+        the system, gates, planets, moons and star rows as tuples
+        """
+        name, region, constellation = work_item
+        element = self._cache.load(self._source, name)
+
+        data = {'path': name, 'region': region, 'constellation': constellation,
+                'gates': [], 'planets': [], 'moons': [], 'star': None}
+        solar_system_id = element['solarSystemID']
+        center = element['center']
+        # the name is resolved by the writer (index 1)
+        row = (solar_system_id, None, constellation['id'], element['corridor'],
+               element['fringe'], element['hub'], element['international'],
+               element['luminosity'], element['radius'], center[0], center[1], center[2],
+               element['regional'], element['security'], element.get('securityClass'))
+        if self._config.extended_coordinates:
+            row += tuple(element['max']) + tuple(element['min'])
+        # projX, projY and projZ are calculated for every system at once by the writer
+        data['system'] = row
+
+        # avoiding parsing gates, stars and planets for systems that doesn't have it
+        if self.has_celestials(solar_system_id):
+            if self._config.with_gates:
+                self._read_gates(data, solar_system_id, element['stargates'])
+            self._read_planets(data, solar_system_id, element['planets'])
+            self._read_star(data, solar_system_id, element['star'])
+        return data
+
+    def _read_gates(self, data, solar_system_id, node):
+        for gate_id, gate in node.items():
+            position = gate['position']
+            data['gates'].append((gate_id, solar_system_id, gate['typeID'], position[0],
+                                  position[1], position[2], gate['destination']))
+
+    def _read_planets(self, data, solar_system_id, node):
+        for planet_id, planet in node.items():
+            statistics = planet['statistics']
+            position = planet['position']
+            data['planets'].append((planet_id, solar_system_id, planet['celestialIndex'],
+                                    statistics['fragmented'], statistics['radius'],
+                                    statistics['locked'], planet['typeID'], position[0],
+                                    position[1], position[2]))
+            if 'moons' in planet and self._config.with_moons:
+                self._read_moons(data, solar_system_id, planet_id, planet['moons'])
+
+    def _read_moons(self, data, solar_system_id, planet_id, node):
+        cont = 1
+        for moon_id, moon in node.items():
+            radius = None
+            if 'statistics' in moon:
+                radius = moon['statistics']['radius']
+            position = moon['position']
+            data['moons'].append((moon_id, solar_system_id, cont, planet_id, moon['typeID'],
+                                  radius, position[0], position[1], position[2]))
+            cont += 1
+
+    def _read_star(self, data, solar_system_id, node):
+        # typeID is translated to starTypeId by the writer
+        data['star'] = (node['id'], solar_system_id, node['statistics']['locked'],
+                        node['statistics']['radius'], node['typeID'])
@@ -0,0 +1,84 @@
+# -*- coding: UTF-8 -*-
+"""
+Provides tools to read big SDE YAML files one entry at a time
+without loading the whole document into memory
+"""
+import yaml
+from yaml.composer import Composer
+from yaml.events import MappingStartEvent, MappingEndEvent
+from yaml.events import SequenceStartEvent, SequenceEndEvent
+
+try:
+    from yaml import CSafeLoader as _BaseLoader
+except ImportError:
+    from yaml import SafeLoader as _BaseLoader
+
+
+class StreamingLoader(_BaseLoader, Composer):
+    """
+    Safe loader that uses the libyaml parser (when it is available) to
+    produce events and composes only one node of the document at a time
+    """
+    def __init__(self, stream):
+        _BaseLoader.__init__(self, stream)
+        Composer.__init__(self)
+
+    def next_object(self):
+        """
+        Compose and construct the next node in the stream, the internal
+        caches are cleared so memory doesn't grow with the document size
+        """
+        node = self.compose_node(None, None)
+        data = self.construct_object(node, deep=True)
+        self.anchors = {}
+        self.constructed_objects = {}
+        self.recursive_objects = {}
+        return data
+
+
+class YamlStream():
+    """Iterates over the top level collection of a YAML document"""
+
+    @classmethod
+    def load(cls, stream):
+        """
+        Load a complete (small) document using the fastest safe loader available
+        """
+        return yaml.load(stream, Loader=_BaseLoader)
+
+    @classmethod
+    def _open_collection(cls, loader, start_event):
+        # StreamStart and DocumentStart events
+        loader.get_event()
+        loader.get_event()
+        if not loader.check_event(start_event):
+            raise yaml.YAMLError('Unexpected top level node in the YAML document')
+        loader.get_event()
+
+    @classmethod
+    def iterate_mapping(cls, stream):
+        """
+        Yields (key, value) tuples from a document whose root is a mapping
+        """
+        loader = StreamingLoader(stream)
+        try:
+            cls._open_collection(loader, MappingStartEvent)
+            while not loader.check_event(MappingEndEvent):
+                key = loader.next_object()
+                value = loader.next_object()
+                yield key, value
+        finally:
+            loader.dispose()
+
+    @classmethod
+    def iterate_sequence(cls, stream):
+        """
+        Yields every item from a document whose root is a sequence
+        """
+        loader = StreamingLoader(stream)
+        try:
+            cls._open_collection(loader, SequenceStartEvent)
+            while not loader.check_event(SequenceEndEvent):
+                yield loader.next_object()
+        finally:
+            loader.dispose()